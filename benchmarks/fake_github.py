@@ -0,0 +1,472 @@
+"""
+benchmarks.fake_github
+~~~~~~~~~~~~~~~~~~~~~~
+
+A local stand-in for the GitHub API serving a synthetic repository, with
+pagination, conditional requests and rate limit headers like the real one.
+
+It's served under ``/api/v3`` so ``github3.GitHubEnterprise`` can talk to it.
+"""
+
+import json
+import random
+import hashlib
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+API = '/api/v3'
+
+EPOCH = datetime(2020, 1, 1)
+
+WORDS = ("cache fetch list render widget issue label diff comment request "
+         "page token thread loop screen focus store index sync query").split()
+
+LANGUAGES = ('py', 'js', 'c', 'md')
+
+
+def timestamp(minutes):
+    return (EPOCH + timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def sentence(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+class Repository():
+    """
+    A synthetic repository with ``issues`` issues, ``pulls`` open pull
+    requests with diffs of ``diff_lines`` lines, and ``comments`` comments
+    on every issue and pull request.
+
+    The data only depends on the sizes and the ``seed``.
+    """
+    def __init__(self, base_url, owner='octocat', name='shipit',
+                 issues=10000, pulls=500, diff_lines=20000, comments=1000,
+                 labels=20, milestones=3, seed=0):
+        self.base_url = base_url
+        self.owner = owner
+        self.name = name
+        self.issues = issues
+        self.pulls = pulls
+        self.diff_lines = diff_lines
+        self.comments = comments
+        self.seed = seed
+        self.labels = [self.label(n) for n in range(labels)]
+        self.milestones = [self.milestone(n) for n in range(1, milestones + 1)]
+        self._diffs = {}
+
+    @property
+    def url(self):
+        return '%s%s/repos/%s/%s' % (self.base_url, API, self.owner, self.name)
+
+    def user(self, n):
+        login = 'user%s' % n
+        return {
+            'login': login,
+            'id': n,
+            'avatar_url': '',
+            'gravatar_id': '',
+            'url': '%s%s/users/%s' % (self.base_url, API, login),
+            'html_url': 'https://github.com/%s' % login,
+            'type': 'User',
+        }
+
+    def label(self, n):
+        name = 'label-%s' % n
+        return {
+            'url': '%s/labels/%s' % (self.url, name),
+            'name': name,
+            'color': '%06x' % (n * 0x0b0b0b % 0xffffff),
+        }
+
+    def milestone(self, n):
+        return {
+            'url': '%s/milestones/%s' % (self.url, n),
+            'number': n,
+            'state': 'open',
+            'title': 'v%s.0' % n,
+            'description': '',
+            'creator': self.user(0),
+            'open_issues': 0,
+            'closed_issues': 0,
+            'created_at': timestamp(0),
+            'due_on': None,
+        }
+
+    def repository(self):
+        return {
+            'id': 1,
+            'name': self.name,
+            'full_name': '%s/%s' % (self.owner, self.name),
+            'owner': self.user(0),
+            'private': False,
+            'description': 'A synthetic repository',
+            'fork': False,
+            'url': self.url,
+            'html_url': 'https://github.com/%s/%s' % (self.owner, self.name),
+            'clone_url': 'https://github.com/%s/%s.git' % (self.owner, self.name),
+            'git_url': 'git://github.com/%s/%s.git' % (self.owner, self.name),
+            'ssh_url': 'git@github.com:%s/%s.git' % (self.owner, self.name),
+            'homepage': '',
+            'language': 'Python',
+            'forks': 0,
+            'forks_count': 0,
+            'watchers': 0,
+            'watchers_count': 0,
+            'size': 0,
+            'master_branch': 'master',
+            'default_branch': 'master',
+            'open_issues': self.issues,
+            'open_issues_count': self.issues,
+            'has_issues': True,
+            'has_wiki': False,
+            'has_downloads': False,
+            'pushed_at': timestamp(0),
+            'created_at': timestamp(0),
+            'updated_at': timestamp(0),
+        }
+
+    # -- Issues and pull requests ---------------------------------------------
+
+    def is_pull(self, number):
+        # The pull requests are the first numbers
+        return number <= self.pulls
+
+    def numbers(self):
+        return range(1, self.pulls + self.issues + 1)
+
+    def state(self, number):
+        if self.is_pull(number):
+            return 'open'
+        return 'closed' if number % 3 == 0 else 'open'
+
+    def updated_minutes(self, number):
+        # Spread the updates so sorting by them isn't sorting by number
+        return (number * 7919) % (self.pulls + self.issues) + number
+
+    def issue(self, number):
+        rnd = random.Random(self.seed * 1000003 + number)
+        url = '%s/issues/%s' % (self.url, number)
+        body = '\n\n'.join(sentence(rnd, 20) for _ in range(3))
+        issue = {
+            'id': number,
+            'number': number,
+            'url': url,
+            'html_url': 'https://github.com/%s/%s/issues/%s' % (self.owner, self.name, number),
+            'comments_url': url + '/comments',
+            'events_url': url + '/events',
+            'labels_url': url + '/labels{/name}',
+            'title': sentence(rnd, 8),
+            'body': body,
+            'body_text': body,
+            'body_html': '<p>%s</p>' % body,
+            'user': self.user(number % 50),
+            'labels': rnd.sample(self.labels, min(len(self.labels), rnd.randint(0, 3))),
+            'state': self.state(number),
+            'assignee': self.user(number % 7) if number % 4 == 0 else None,
+            'milestone': (self.milestones[number // 5 % len(self.milestones)]
+                          if self.milestones and number % 5 == 0 else None),
+            'comments': self.comments,
+            'closed_at': timestamp(self.updated_minutes(number)) if self.state(number) == 'closed' else None,
+            'closed_by': None,
+            'created_at': timestamp(number),
+            'updated_at': timestamp(self.updated_minutes(number)),
+        }
+        if self.is_pull(number):
+            pull_url = '%s/pulls/%s' % (self.url, number)
+            issue['pull_request'] = {'url': pull_url,
+                                     'html_url': pull_url,
+                                     'diff_url': pull_url + '.diff',
+                                     'patch_url': pull_url + '.patch'}
+        return issue
+
+    def pull(self, number, full=False):
+        issue = self.issue(number)
+        url = '%s/pulls/%s' % (self.url, number)
+        head_sha = hashlib.sha1(b'head%d' % number).hexdigest()
+        base_sha = hashlib.sha1(b'base%d' % number).hexdigest()
+        repository = self.repository()
+        pull = {
+            'id': number,
+            'number': number,
+            'url': url,
+            'html_url': 'https://github.com/%s/%s/pull/%s' % (self.owner, self.name, number),
+            'diff_url': url + '.diff',
+            'patch_url': url + '.patch',
+            # github3 0.6 parses the owner and name from the HTML URL
+            'issue_url': issue['html_url'],
+            'comments_url': issue['comments_url'],
+            'review_comments_url': url + '/comments',
+            'review_comment_url': url + '/comments/{number}',
+            'commits_url': url + '/commits',
+            'statuses_url': '%s/statuses/%s' % (self.url, head_sha),
+            'title': issue['title'],
+            'body': issue['body'],
+            'body_text': issue['body_text'],
+            'body_html': issue['body_html'],
+            'user': issue['user'],
+            'state': 'open',
+            'assignee': None,
+            'milestone': None,
+            'merged': False,
+            'merged_at': None,
+            'merged_by': None,
+            'merge_commit_sha': None,
+            'mergeable': True,
+            'closed_at': None,
+            'created_at': issue['created_at'],
+            'updated_at': issue['updated_at'],
+            'head': {'label': 'user:feature-%s' % number,
+                     'ref': 'feature-%s' % number,
+                     'sha': head_sha,
+                     'user': issue['user'],
+                     'repo': repository},
+            'base': {'label': 'octocat:master',
+                     'ref': 'master',
+                     'sha': base_sha,
+                     'user': self.user(0),
+                     'repo': repository},
+            '_links': {},
+        }
+        if full:
+            diff = self.diff(number)
+            pull.update({
+                'comments': self.comments,
+                'review_comments': self.comments,
+                'commits': 3,
+                'additions': diff.count(b'\n+') - diff.count(b'\n+++'),
+                'deletions': diff.count(b'\n-') - diff.count(b'\n---'),
+                'changed_files': diff.count(b'diff --git '),
+            })
+        return pull
+
+    def comment(self, parent, n, review=False):
+        rnd = random.Random(self.seed * 1000003 + parent * 10007 + n)
+        body = sentence(rnd, 30)
+        comment = {
+            'id': parent * 100000 + n,
+            'url': '%s/issues/comments/%s' % (self.url, parent * 100000 + n),
+            'html_url': '',
+            'body': body,
+            'body_text': body,
+            'body_html': '<p>%s</p>' % body,
+            'user': self.user(n % 50),
+            'created_at': timestamp(parent + n),
+            'updated_at': timestamp(parent + n),
+        }
+        if review:
+            comment.update({
+                'url': '%s/pulls/comments/%s' % (self.url, comment['id']),
+                'diff_hunk': '@@ -1,3 +1,3 @@',
+                'path': 'src/module%s.py' % (n % 10),
+                'position': n % 20,
+                'original_position': n % 20,
+                'commit_id': hashlib.sha1(b'head%d' % parent).hexdigest(),
+                'original_commit_id': hashlib.sha1(b'head%d' % parent).hexdigest(),
+                '_links': {},
+            })
+        return comment
+
+    def diff(self, number):
+        """Return a unified diff of about ``diff_lines`` lines."""
+        if number in self._diffs:
+            return self._diffs[number]
+
+        rnd = random.Random(self.seed * 1000003 + number)
+        lines, file_number = [], 0
+        while len(lines) < self.diff_lines:
+            path = 'src/module%s.%s' % (file_number, LANGUAGES[file_number % len(LANGUAGES)])
+            lines.extend(['diff --git a/%s b/%s' % (path, path),
+                          'index %07x..%07x 100644' % (file_number, file_number + 1),
+                          '--- a/%s' % path,
+                          '+++ b/%s' % path])
+            for hunk in range(10):
+                start = hunk * 100 + 1
+                lines.append('@@ -%s,20 +%s,20 @@ def function_%s():' % (start, start, hunk))
+                for _ in range(20):
+                    prefix = rnd.choice(' +-  ')
+                    lines.append('%s    value = "%s"  # %s' % (prefix,
+                                                                sentence(rnd, 3),
+                                                                rnd.choice(WORDS)))
+            file_number += 1
+
+        diff = ('\n'.join(lines[:self.diff_lines]) + '\n').encode('utf-8')
+        self._diffs[number] = diff
+        return diff
+
+    # -- Listings -------------------------------------------------------------
+
+    def list_issues(self, state, sort, since, filters=None):
+        """
+        List the issues in ``state``, matching the ``labels``, ``assignee``,
+        ``milestone`` and ``creator`` in ``filters`` like GitHub does.
+        """
+        numbers = [n for n in self.numbers() if state == 'all' or self.state(n) == state]
+        if since:
+            numbers = [n for n in numbers if timestamp(self.updated_minutes(n)) >= since]
+        if sort == 'updated':
+            numbers.sort(key=self.updated_minutes, reverse=True)
+        else:
+            numbers.sort(reverse=True)
+        issues = (self.issue(n) for n in numbers)
+        return [i for i in issues if self.matches(i, filters or {})]
+
+    @staticmethod
+    def matches(issue, filters):
+        login = lambda user: user['login'] if user else None
+        if 'labels' in filters:
+            names = set(label['name'] for label in issue['labels'])
+            if not set(filters['labels'].split(',')) <= names:
+                return False
+        if 'assignee' in filters and login(issue['assignee']) != filters['assignee']:
+            return False
+        if 'creator' in filters and login(issue['user']) != filters['creator']:
+            return False
+        if 'milestone' in filters:
+            milestone = issue['milestone']
+            if milestone is None or str(milestone['number']) != filters['milestone']:
+                return False
+        return True
+
+    def list_pulls(self, state):
+        if state == 'closed':
+            return []
+        return [self.pull(n) for n in range(self.pulls, 0, -1)]
+
+    def list_comments(self, number, review=False):
+        return [self.comment(number, n, review) for n in range(self.comments)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answer the requests to the fake API of ``server.repo``."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        path = url.path[len(API):] if url.path.startswith(API) else url.path
+        parts = path.strip('/').split('/')
+
+        self.server.count(url.path)
+
+        repo = self.server.repo
+        if parts[:3] != ['repos', repo.owner, repo.name]:
+            return self.respond(404, {'message': 'Not Found'})
+
+        route = parts[3:]
+        if not route:
+            return self.respond(200, repo.repository())
+        elif route == ['issues']:
+            items = repo.list_issues(query.get('state', 'open'),
+                                     query.get('sort', 'created'),
+                                     query.get('since'),
+                                     query)
+            return self.paginate(items, query)
+        elif route == ['pulls']:
+            return self.paginate(repo.list_pulls(query.get('state', 'open')), query)
+        elif route == ['labels']:
+            return self.paginate(repo.labels, query)
+        elif route == ['milestones']:
+            return self.paginate(repo.milestones, query)
+        elif len(route) == 2 and route[0] in ('issues', 'pulls') and route[1].isdigit():
+            number = int(route[1])
+            if route[0] == 'issues':
+                return self.respond(200, repo.issue(number))
+            elif 'diff' in self.headers.get('Accept', ''):
+                return self.respond(200, repo.diff(number), 'text/plain')
+            return self.respond(200, repo.pull(number, full=True))
+        elif len(route) == 3 and route[1].isdigit() and route[2] == 'comments':
+            comments = repo.list_comments(int(route[1]), review=route[0] == 'pulls')
+            return self.paginate(comments, query)
+
+        return self.respond(404, {'message': 'Not Found'})
+
+    def paginate(self, items, query):
+        per_page = int(query.get('per_page', 30))
+        page = int(query.get('page', 1))
+        last = max((len(items) + per_page - 1) // per_page, 1)
+
+        links = []
+        for rel, number in (('next', page + 1), ('last', last)):
+            if number <= last and page < last:
+                params = dict(query, page=number)
+                links.append('<%s%s?%s>; rel="%s"' % (self.server.base_url,
+                                                       urlparse(self.path).path,
+                                                       urlencode(params),
+                                                       rel))
+
+        start = (page - 1) * per_page
+        headers = {'Link': ', '.join(links)} if links else {}
+        return self.respond(200, items[start:start + per_page], headers=headers)
+
+    def respond(self, status, data, content_type='application/json', headers=None):
+        body = data if isinstance(data, bytes) else json.dumps(data).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', '%s; charset=utf-8' % content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        for name, value in self.server.rate_limit_headers().items():
+            self.send_header(name, value)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """
+    A fake GitHub API for ``repo`` listening on localhost, counting the
+    requests it answers.
+
+    Use ``repository_for(port)`` to build the repository once the port is
+    known, and ``start`` to serve in a background thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, repository_for, port=0, rate_limit=5000):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.base_url = 'http://127.0.0.1:%s' % self.server_address[1]
+        self.repo = repository_for(self.base_url)
+        self.rate_limit = rate_limit
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] += 1
+
+    def reset_count(self):
+        with self._lock:
+            self.requests.clear()
+
+    @property
+    def request_count(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def rate_limit_headers(self):
+        remaining = max(self.rate_limit - self.request_count, 0)
+        return {'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset': '0'}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,529 @@
+"""
+benchmarks.run
+~~~~~~~~~~~~~~
+
+Time shipit's fetching and drawing against a fake GitHub API serving a big
+synthetic repository, and compare the results with stored baselines.
+
+Run it from the root of the repository::
+
+    python -m benchmarks.run [--save-baseline] [benchmark ...]
+
+Every benchmark drives the real code headlessly: the executor callbacks are
+called from this thread instead of a ``MainLoop`` and widgets are rendered
+to canvases of a fixed size, which is what the screen would draw.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from github3 import GitHubEnterprise
+from github3.issues import Issue
+from github3.pulls import PullRequest
+
+from shipit.ui import UI
+from shipit.core import Shipit, IssuesAndPullRequests
+from shipit.cache import Cache
+from shipit.executor import Executor
+from shipit.journal import Journal
+from shipit.query import Query
+from shipit.http import configure_session
+from shipit.config import WORKERS, KEY_NEXT_FILE
+
+from .fake_github import FakeGitHub, Repository
+
+# Where the baselines are stored by default
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# The size of the screen widgets are rendered to
+SIZE = (160, 50)
+
+# Seconds to wait for the background work of a benchmark to finish
+SETTLE_TIMEOUT = 600
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(fn):
+    """
+    Register the benchmark ``fn``, which is called with the ``Environment``
+    to set it up and returns the function to time.
+    """
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def settle(executor):
+    """Call the callbacks of the ``executor`` until all its work is done."""
+    deadline = time.perf_counter() + SETTLE_TIMEOUT
+    while True:
+        executor.run_pending()
+        if executor.idle():
+            return
+        if time.perf_counter() > deadline:
+            raise RuntimeError("The background work didn't finish")
+        time.sleep(0.001)
+
+
+def draw(widget, size=SIZE):
+    """Render ``widget`` like the screen does, returning the rendered rows."""
+    canvas = widget.render(size, focus=True)
+    return list(canvas.content())
+
+
+class Environment():
+    """
+    The fake API ``server`` and a scratch ``directory`` for the caches of
+    the benchmarks.
+    """
+    def __init__(self, server, directory):
+        self.server = server
+        self.directory = directory
+        self._template = None
+        self._cleanups = []
+
+    def repository(self):
+        """Return the repository with a new client, like ``cli.main`` does."""
+        api = GitHubEnterprise(self.server.base_url)
+        configure_session(api._session)
+        repo = self.server.repo
+        return api.repository(repo.owner, repo.name)
+
+    def cache(self):
+        """Return a new empty cache."""
+        path = tempfile.mkdtemp(dir=self.directory)
+        cache = Cache(self.server.repo.owner, self.server.repo.name, path)
+        self.on_cleanup(cache.close)
+        return cache
+
+    def warm_cache(self):
+        """
+        Return a new cache with every open issue and pull request, the
+        labels and the comments of the first issue and pull request, as
+        left by a previous session.
+        """
+        if self._template is None:
+            self._template = self._fill_template()
+
+        path = tempfile.mkdtemp(dir=self.directory)
+        shutil.copytree(self._template, path, dirs_exist_ok=True)
+        cache = Cache(self.server.repo.owner, self.server.repo.name, path)
+        self.on_cleanup(cache.close)
+        return cache
+
+    def _fill_template(self):
+        cleanups, self._cleanups = self._cleanups, []
+        cache = Cache(self.server.repo.owner, self.server.repo.name,
+                      tempfile.mkdtemp(dir=self.directory))
+        try:
+            shipit = self.shipit(cache)
+            items = shipit.issues_and_prs
+            items.show_pull_requests()
+            settle(shipit.executor)
+            shipit.fetch_comments(first(items.store.select(kind='issue', state='open')))
+            shipit.fetch_comments(first(items.store.select(kind='pull', state='open')))
+        finally:
+            self.cleanup()
+            self._cleanups = cleanups
+            cache.close()
+        return cache.path
+
+    def shipit(self, cache):
+        """
+        Return a ``Shipit`` with ``cache`` showing the open issues, once the
+        work it starts in the background finished.
+        """
+        repo = self.repository()
+        shipit = Shipit(UI(repo), repo, cache=cache)
+        self.on_cleanup(shipit.executor.detach)
+        shipit.issue_list()
+        settle(shipit.executor)
+        return shipit
+
+    def on_cleanup(self, fn):
+        self._cleanups.append(fn)
+
+    def cleanup(self):
+        while self._cleanups:
+            self._cleanups.pop()()
+
+
+def first(items):
+    # The item with the lowest number, which has the same data on every run
+    return min(items, key=lambda item: item.number)
+
+
+def items_and_executor(env, cache):
+    repo = env.repository()
+    executor = Executor(WORKERS)
+    env.on_cleanup(executor.detach)
+    journal = Journal(repo, cache, executor, lambda delay, callback: None)
+
+    def create():
+        return IssuesAndPullRequests(repo, executor, cache, journal)
+
+    return create, executor
+
+
+# -- Benchmarks ---------------------------------------------------------------
+
+@benchmark
+def fetch_open_issues_cold(env):
+    """Download every open issue into an empty cache."""
+    create, executor = items_and_executor(env, env.cache())
+
+    def run():
+        items = create()
+        items.show_open_issues()
+        settle(executor)
+        assert not items.fetch.failed
+
+    return run
+
+
+@benchmark
+def fetch_open_issues_warm(env):
+    """Load the open issues from the cache and revalidate them."""
+    create, executor = items_and_executor(env, env.warm_cache())
+
+    def run():
+        items = create()
+        items.show_open_issues()
+        settle(executor)
+        assert not items.fetch.failed
+
+    return run
+
+
+@benchmark
+def fetch_label_cold(env):
+    """Download only the open issues with a label into an empty cache."""
+    create, executor = items_and_executor(env, env.cache())
+
+    def run():
+        items = create()
+        items.filter(Query(labels=['label-0']))
+        settle(executor)
+        assert not items.fetch.failed
+
+    return run
+
+
+@benchmark
+def fetch_pull_requests_cold(env):
+    """Download every open pull request into an empty cache."""
+    create, executor = items_and_executor(env, env.cache())
+
+    def run():
+        items = create()
+        items.show_pull_requests()
+        settle(executor)
+        assert not items.fetch.failed
+
+    return run
+
+
+@benchmark
+def list_build(env):
+    """Build the list of open issues and draw it."""
+    cache = env.warm_cache()
+    repo = env.repository()
+    issues = cache.items('issue', Issue, repo, state='open')
+
+    def run():
+        ui = UI(repo)
+        ui.issues_and_pulls(issues)
+        draw(ui)
+
+    return run
+
+
+@benchmark
+def list_reset(env):
+    """Replace the list of open issues with the pull requests and draw it."""
+    cache = env.warm_cache()
+    repo = env.repository()
+    issues = cache.items('issue', Issue, repo, state='open')
+    prs = cache.items('pull', PullRequest, repo, state='open')
+    ui = UI(repo)
+    ui.issues_and_pulls(issues)
+    draw(ui)
+
+    def run():
+        ui.issues_and_pulls(prs)
+        draw(ui)
+        ui.issues_and_pulls(issues)
+        draw(ui)
+
+    return run
+
+
+@benchmark
+def list_scroll(env):
+    """Scroll through 50 pages of open issues, drawing every one."""
+    cache = env.warm_cache()
+    repo = env.repository()
+    ui = UI(repo)
+    ui.issues_and_pulls(cache.items('issue', Issue, repo, state='open'))
+    draw(ui)
+
+    def run():
+        for _ in range(50):
+            ui.keypress(SIZE, 'page down')
+            draw(ui)
+
+    return run
+
+
+@benchmark
+def issue_detail(env):
+    """Open an issue with a long comment thread and draw it."""
+    shipit = env.shipit(env.warm_cache())
+    issue = first(shipit.issues_and_prs.store.select(kind='issue', state='open'))
+
+    def run():
+        shipit.issue_detail(issue)
+        draw(shipit.ui)
+        settle(shipit.executor)
+        draw(shipit.ui)
+
+    return run
+
+
+@benchmark
+def pull_request_detail(env):
+    """Open a pull request with a long comment thread and draw it."""
+    shipit = env.shipit(env.warm_cache())
+    pr = first(shipit.issues_and_prs.store.select(kind='pull', state='open'))
+
+    def run():
+        shipit.pull_request_detail(pr)
+        draw(shipit.ui)
+        settle(shipit.executor)
+        draw(shipit.ui)
+
+    return run
+
+
+def show_diff(shipit, pr):
+    shipit.diff(pr)
+    settle(shipit.executor)
+    draw(shipit.ui)
+
+    # Jump through the first files like a reviewer does
+    for _ in range(10):
+        shipit.ui.keypress(SIZE, KEY_NEXT_FILE)
+        draw(shipit.ui)
+        settle(shipit.executor)
+
+
+@benchmark
+def diff_cold(env):
+    """Download, index and draw the diff of a pull request."""
+    shipit = env.shipit(env.warm_cache())
+    pr = first(shipit.issues_and_prs.store.select(kind='pull', state='open'))
+    shipit.pull_request_detail(pr)
+    settle(shipit.executor)
+
+    def run():
+        show_diff(shipit, pr)
+
+    return run
+
+
+@benchmark
+def diff_cached(env):
+    """Draw the diff of a pull request from the diff cache."""
+    shipit = env.shipit(env.warm_cache())
+    pr = first(shipit.issues_and_prs.store.select(kind='pull', state='open'))
+    shipit.pull_request_detail(pr)
+    settle(shipit.executor)
+    show_diff(shipit, pr)
+    shipit.pull_request_detail(pr)
+    settle(shipit.executor)
+
+    def run():
+        show_diff(shipit, pr)
+
+    return run
+
+
+# -- Running ------------------------------------------------------------------
+
+def measure(env, bench, repeat, memory=True):
+    """
+    Run ``bench`` ``repeat`` times, each with a fresh setup, returning the
+    fastest wall time, the requests made and the peak of memory allocated
+    while running it.
+    """
+    times, requests = [], 0
+    for _ in range(repeat):
+        run = bench(env)
+        env.server.reset_count()
+        start = time.perf_counter()
+        try:
+            run()
+        finally:
+            times.append(time.perf_counter() - start)
+            requests = env.server.request_count
+            env.cleanup()
+
+    result = OrderedDict([('seconds', min(times)), ('requests', requests)])
+
+    if memory:
+        # Tracing allocations is slow, it gets a run of its own
+        run = bench(env)
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            env.cleanup()
+
+    return result
+
+
+def regressions(name, result, baseline, tolerance):
+    """Return the descriptions of what got worse than the ``baseline``."""
+    found = []
+    if result['seconds'] > baseline['seconds'] * (1 + tolerance):
+        found.append("%s: %.3fs, was %.3fs" % (name, result['seconds'],
+                                               baseline['seconds']))
+    if result['requests'] > baseline['requests']:
+        found.append("%s: %s requests, were %s" % (name, result['requests'],
+                                                   baseline['requests']))
+    if 'peak_bytes' in result and 'peak_bytes' in baseline:
+        if result['peak_bytes'] > baseline['peak_bytes'] * (1 + tolerance):
+            found.append("%s: %.1f MiB peak, was %.1f MiB" % (
+                name,
+                result['peak_bytes'] / 2 ** 20,
+                baseline['peak_bytes'] / 2 ** 20))
+    return found
+
+
+def format_result(name, result, baseline=None):
+    line = "%-26s %9.3fs %7s req" % (name, result['seconds'], result['requests'])
+    if 'peak_bytes' in result:
+        line += " %9.1f MiB" % (result['peak_bytes'] / 2 ** 20)
+    if baseline is not None:
+        line += "   (%+.0f%%)" % ((result['seconds'] / baseline['seconds'] - 1) * 100)
+    return line
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, sizes, results):
+    baselines = load_baselines(path)
+    if baselines is None or baselines['sizes'] != sizes:
+        baselines = {'sizes': sizes, 'results': {}}
+    baselines['results'].update(results)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def read_arguments():
+    parser = ArgumentParser("benchmarks.run")
+    parser.add_argument("benchmarks",
+                        nargs='*',
+                        help="The benchmarks to run, all of them by default")
+    parser.add_argument("--list",
+                        action="store_true",
+                        help="List the benchmarks and exit")
+    parser.add_argument("--issues", type=int, default=10000,
+                        help="Number of issues of the synthetic repository")
+    parser.add_argument("--pulls", type=int, default=500,
+                        help="Number of open pull requests")
+    parser.add_argument("--diff-lines", type=int, default=20000,
+                        help="Number of lines of every pull request diff")
+    parser.add_argument("--comments", type=int, default=1000,
+                        help="Number of comments of every issue and pull request")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Times every benchmark runs, the fastest is reported")
+    parser.add_argument("--no-memory",
+                        action="store_true",
+                        help="Don't measure the peak memory")
+    parser.add_argument("--baseline",
+                        default=BASELINES,
+                        help="The file with the baselines")
+    parser.add_argument("--save-baseline",
+                        action="store_true",
+                        help="Store the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Slowdown over the baseline considered a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = read_arguments()
+
+    if args.list:
+        for name, bench in BENCHMARKS.items():
+            print("%-26s %s" % (name, bench.__doc__))
+        return 0
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print("Unknown benchmarks: %s" % ", ".join(unknown), file=sys.stderr)
+        return 2
+
+    sizes = OrderedDict([('issues', args.issues),
+                         ('pulls', args.pulls),
+                         ('diff_lines', args.diff_lines),
+                         ('comments', args.comments)])
+
+    baselines = load_baselines(args.baseline)
+    if baselines is not None and baselines['sizes'] != sizes:
+        print("The baselines are for other sizes, not comparing", file=sys.stderr)
+        baselines = None
+    baseline_results = baselines['results'] if baselines else {}
+
+    server = FakeGitHub(lambda url: Repository(url, **sizes))
+    server.start()
+    directory = tempfile.mkdtemp(prefix='shipit-benchmarks-')
+    env = Environment(server, directory)
+
+    results, found = OrderedDict(), []
+    try:
+        for name in names:
+            result = measure(env, BENCHMARKS[name], args.repeat, not args.no_memory)
+            results[name] = result
+            baseline = baseline_results.get(name, None)
+            print(format_result(name, result, baseline))
+            if baseline is not None:
+                found.extend(regressions(name, result, baseline, args.tolerance))
+    finally:
+        env.cleanup()
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, sizes, results)
+        print("Saved the baselines to %s" % args.baseline)
+        return 0
+
+    if found:
+        print("\nRegressions:", file=sys.stderr)
+        for regression in found:
+            print("  %s" % regression, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,7 +12,10 @@ from setuptools import setup, find_packages
 from shipit import NAME, DESCRIPTION, VERSION
 
 REQUIREMENTS = [
-    "github3.py==0.6.0",
+    "github3.py==0.9.6",
+    # Retry and the unvendored urllib3 for the shared HTTP session
+    "requests>=2.16.0",
+    "urllib3>=1.21.1",
     "urwid==1.1.1",
     "x256==0.0.2",
 ]
@@ -6,6 +6,7 @@ from github3 import authorize
 from github3 import login as github_login
 
 from shipit import DESCRIPTION
+from .http import configure_session
 
 
 # Path to config file
@@ -36,8 +37,31 @@ def login():
         c.add_section('credentials')
         c.set('credentials', 'token', str(token))
         c.set('credentials', 'id', str(auth.id))
+        c.set('credentials', 'user', user)
 
         with open(CONFIG_FILE, 'w') as f:
             c.write(f)
 
-    return github_login(token=token)
+    api = github_login(token=token)
+    # Every object created from it shares the session
+    configure_session(api._session)
+    return api
+
+
+def current_user(api):
+    """
+    Return the login of the user authenticated with ``api``, stored with
+    the credentials so GitHub is only asked for it once.
+    """
+    c = ConfigParser()
+    c.read(CONFIG_FILE)
+
+    if c.has_option('credentials', 'user'):
+        return c.get('credentials', 'user')
+
+    user = str(api.user())
+    if c.has_section('credentials'):
+        c.set('credentials', 'user', user)
+        with open(CONFIG_FILE, 'w') as f:
+            c.write(f)
+    return user
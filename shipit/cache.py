@@ -0,0 +1,401 @@
+"""
+shipit.cache
+~~~~~~~~~~~~
+
+Persistent on-disk cache of GitHub data.
+
+Each repository gets a SQLite database under ``~/.cache/shipit/<owner>/<repo>``
+where the JSON of issues, pull requests, comments and labels is stored along
+with the ETag of the request that returned it, so it can be revalidated with
+a conditional request.
+
+Pull request diffs never change for the same base and head commits, they are
+stored compressed in the ``diffs`` directory next to the database.
+"""
+
+import os
+import gzip
+import json
+import shutil
+import sqlite3
+import threading
+
+from .paging import iter_pages, PER_PAGE
+
+
+# Root directory of the cache
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                        os.path.join(os.environ['HOME'], '.cache')),
+                         'shipit')
+
+# The name of the database inside a repository's cache directory
+DATABASE = 'cache.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    state TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    parent TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (parent, id)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS validators (
+    key TEXT PRIMARY KEY,
+    etag TEXT
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    key TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS repository (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    number INTEGER,
+    base TEXT,
+    data TEXT NOT NULL
+);
+"""
+
+# The name of the directory with the diffs inside a repository's cache directory
+DIFFS = 'diffs'
+
+# Status code of a response to a conditional request for unmodified data
+NOT_MODIFIED = 304
+
+
+def repo_cache_dir(owner, repo):
+    return os.path.join(CACHE_DIR, owner, repo)
+
+
+def cached_repositories():
+    """Return the ``(owner, repo)`` of every repository with a cache."""
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    return [(owner, repo)
+            for owner in sorted(os.listdir(CACHE_DIR))
+            for repo in sorted(os.listdir(os.path.join(CACHE_DIR, owner)))]
+
+
+def clear_cache():
+    """
+    Remove the cache of every repository but the changes not sent to GitHub
+    yet, and return the ``<owner>/<repo>`` of the repositories with some.
+    """
+    kept = []
+    for owner, repo in cached_repositories():
+        path = repo_cache_dir(owner, repo)
+        mutations = []
+        if os.path.exists(os.path.join(path, DATABASE)):
+            cache = Cache(owner, repo)
+            mutations = cache.mutations()
+            cache.close()
+
+        shutil.rmtree(path, ignore_errors=True)
+        if mutations:
+            cache = Cache(owner, repo)
+            for _, action, number, base, data in mutations:
+                cache.add_mutation(action, number, base, data)
+            cache.close()
+            kept.append('/'.join([owner, repo]))
+
+    if not kept:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    return kept
+
+
+def cache_stats():
+    """
+    Return a dictionary mapping ``<owner>/<repo>`` to the size in bytes of
+    its cache directory.
+    """
+    return {'/'.join([owner, repo]): directory_size(repo_cache_dir(owner, repo))
+            for owner, repo in cached_repositories()}
+
+
+def directory_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+
+def conditional_pages(cache, key, iterate, changes_first=False):
+    """
+    Call ``iterate(etag=<etag>)`` with the ETag stored for ``key`` and yield
+    the pages of the returned ``GitHubIterator`` as they arrive.
+
+    Nothing is yielded if the server answered that nothing changed since the
+    ETag was stored. The new ETag is stored once every page was consumed.
+
+    GitHub only compares the ETag with the first page, so it's only kept for
+    listings that fit in it, or whose changes always reach it when
+    ``changes_first``, like when sorted by last update. Longer listings are
+    fetched in full every time.
+    """
+    etag = cache.etag(key)
+    iterator = iterate(etag=etag)
+
+    pages, items = 0, 0
+    for page in iter_pages(iterator):
+        pages += 1
+        items += len(page.items)
+        yield page
+
+    not_modified = iterator.last_status == NOT_MODIFIED
+    if etag is not None:
+        cache.count_revalidation(not_modified)
+    if not not_modified:
+        # An item added to a full page would go to the next one
+        fits = pages <= 1 and items < PER_PAGE
+        cache.set_etag(key, iterator.etag if fits or changes_first else None)
+
+
+def conditional(cache, key, iterate, changes_first=False):
+    """
+    Like ``conditional_pages`` but return a list with all the objects, or
+    ``None`` if nothing changed.
+    """
+    pages = [page for page in conditional_pages(cache, key, iterate, changes_first)]
+    if not pages:
+        return None
+    return sum((page.items for page in pages), [])
+
+
+class Cache():
+    """
+    The cache of a repository.
+
+    It's safe to use it from several threads: a single connection is shared
+    and access to it is serialized.
+    """
+    def __init__(self, owner, repo, path=None):
+        self.path = repo_cache_dir(owner, repo) if path is None else path
+        os.makedirs(self.path, exist_ok=True)
+
+        # Conditional requests answered with "Not Modified" and the others
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, DATABASE),
+                                   check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def _query(self, sql, *params):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _update(self, sql, rows):
+        with self._lock, self._db:
+            self._db.executemany(sql, rows)
+
+    # -- Validators -----------------------------------------------------------
+
+    def count_revalidation(self, not_modified):
+        with self._lock:
+            if not_modified:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def etag(self, key):
+        rows = self._query('SELECT etag FROM validators WHERE key = ?', key)
+        return rows[0][0] if rows else None
+
+    def set_etag(self, key, etag):
+        self._update('INSERT OR REPLACE INTO validators VALUES (?, ?)',
+                     [(key, etag)])
+
+    def watermark(self, key):
+        """Return the newest ``updated_at`` synchronized for ``key``."""
+        rows = self._query('SELECT updated_at FROM watermarks WHERE key = ?', key)
+        return rows[0][0] if rows else None
+
+    def set_watermark(self, key, updated_at):
+        self._update('INSERT OR REPLACE INTO watermarks VALUES (?, ?)',
+                     [(key, updated_at)])
+
+    # -- Issues and pull requests ---------------------------------------------
+
+    def items(self, kind, cls, session, state=None):
+        """
+        Return the cached items of ``kind`` as instances of ``cls``, newest
+        first.
+        """
+        if state is None:
+            rows = self._query('SELECT data FROM items WHERE kind = ? '
+                               'ORDER BY id DESC', kind)
+        else:
+            rows = self._query('SELECT data FROM items WHERE kind = ? AND '
+                               'state = ? ORDER BY id DESC', kind, state)
+        return [cls(json.loads(data), session) for data, in rows]
+
+    def item(self, kind, id, cls, session):
+        rows = self._query('SELECT data FROM items WHERE kind = ? AND id = ?',
+                           kind, id)
+        return cls(json.loads(rows[0][0]), session) if rows else None
+
+    def put_items(self, kind, items):
+        """Add ``items`` to the cache, replacing older versions of them."""
+        self._update('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)',
+                     [self._item_row(kind, i) for i in items])
+
+    def replace_items(self, kind, state, items):
+        """
+        Replace the cached items of ``kind`` in ``state`` with ``items``,
+        which are the complete listing of them.
+        """
+        rows = [self._item_row(kind, i) for i in items]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM items WHERE kind = ? AND state = ?',
+                             (kind, state))
+            self._db.executemany('INSERT OR REPLACE INTO items VALUES '
+                                 '(?, ?, ?, ?, ?)', rows)
+
+    @staticmethod
+    def _item_row(kind, item):
+        return (kind, item.id, item.state, str(item.updated_at),
+                json.dumps(item.to_json()))
+
+    # -- Comments -------------------------------------------------------------
+
+    def comments(self, parent, cls, session):
+        """
+        Return the cached comments of the ``parent`` issue or pull request in
+        order.
+        """
+        rows = self._query('SELECT data FROM comments WHERE parent = ? '
+                           'ORDER BY position', parent)
+        return [cls(json.loads(data), session) for data, in rows]
+
+    def set_comments(self, parent, comments):
+        """Replace the cached comments of ``parent`` with ``comments``."""
+        rows = [(parent, c.id, position, json.dumps(c.to_json()))
+                for position, c in enumerate(comments)]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM comments WHERE parent = ?', (parent,))
+            self._db.executemany('INSERT INTO comments VALUES (?, ?, ?, ?)', rows)
+
+    # -- Labels ---------------------------------------------------------------
+
+    def labels(self, cls, session):
+        rows = self._query('SELECT data FROM labels ORDER BY name')
+        return [cls(json.loads(data), session) for data, in rows]
+
+    def set_labels(self, labels):
+        rows = [(l.name, json.dumps(l.to_json())) for l in labels]
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM labels')
+            self._db.executemany('INSERT INTO labels VALUES (?, ?)', rows)
+
+    # -- Repository -----------------------------------------------------------
+
+    def repository(self, cls, session):
+        rows = self._query('SELECT data FROM repository')
+        return cls(json.loads(rows[0][0]), session) if rows else None
+
+    def set_repository(self, repo):
+        self._update('INSERT OR REPLACE INTO repository VALUES (0, ?)',
+                     [(json.dumps(repo.to_json()),)])
+
+    # -- Journal --------------------------------------------------------------
+
+    def mutations(self):
+        """
+        Return the changes not sent to GitHub yet in the order they were
+        made, as ``(id, action, number, base, data)`` tuples.
+        """
+        rows = self._query('SELECT id, action, number, base, data FROM journal '
+                           'ORDER BY id')
+        return [row[:4] + (json.loads(row[4]),) for row in rows]
+
+    def add_mutation(self, action, number, base, data):
+        """Record a change and return its id."""
+        with self._lock, self._db:
+            cursor = self._db.execute('INSERT INTO journal (action, number, base, data) '
+                                      'VALUES (?, ?, ?, ?)',
+                                      (action, number, base, json.dumps(data)))
+            return cursor.lastrowid
+
+    def remove_mutation(self, id):
+        self._update('DELETE FROM journal WHERE id = ?', [(id,)])
+
+    # -- Maintenance ----------------------------------------------------------
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class DiffCache():
+    """
+    Compressed pull request diffs keyed by their base and head commit SHAs.
+
+    When the diffs take more than ``max_bytes`` the least recently used are
+    removed.
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _file(self, base, head):
+        return os.path.join(self.path, '%s..%s.diff.gz' % (base, head))
+
+    def get(self, base, head):
+        """Return the diff between ``base`` and ``head`` or ``None``."""
+        fname = self._file(base, head)
+        with self._lock:
+            try:
+                with gzip.open(fname, 'rb') as f:
+                    raw = f.read()
+            except (OSError, EOFError):
+                self.misses += 1
+                return None
+            # Mark it as recently used
+            os.utime(fname)
+            self.hits += 1
+        return raw
+
+    def put(self, base, head, raw):
+        fname = self._file(base, head)
+        tmp_fname = fname + '.tmp'
+        with self._lock:
+            with gzip.open(tmp_fname, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_fname, fname)
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for fname in os.listdir(self.path):
+            stat = os.stat(os.path.join(self.path, fname))
+            entries.append((stat.st_mtime, stat.st_size, fname))
+
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, fname in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.path, fname))
+            size -= file_size
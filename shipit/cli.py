@@ -1,9 +1,10 @@
+import sys
 from argparse import ArgumentParser
 
-from .ui import UI
-from .core import Shipit
-from .auth import login
-from .git import get_remotes, extract_user_and_repo_from_remote
+from .cache import Cache, clear_cache, cache_stats
+from .config import LOCAL_DIFFS
+from .git import get_remotes, extract_user_and_repo_from_remote, LocalRepository
+from . import instrument
 
 
 ERR_NOT_IN_REPO = 1
@@ -33,19 +34,99 @@ def read_arguments():
                         version=version,
                         help="Show the current version of shipit")
 
+    # cache
+    parser.add_argument("--clear-cache",
+                        action="store_true",
+                        help="Remove the cached GitHub data, but the changes not sent yet, and exit")
+
+    parser.add_argument("--cache-stats",
+                        action="store_true",
+                        help="Show the size of the cache of each repository and exit")
+
+    # fixtures
+    parser.add_argument("--record",
+                        metavar="FIXTURE",
+                        help="Record the requests to GitHub and their responses to FIXTURE")
+
+    parser.add_argument("--replay",
+                        metavar="FIXTURE",
+                        help="Answer the requests to GitHub with the ones recorded in FIXTURE")
+
+    parser.add_argument("--latency",
+                        type=int,
+                        default=0,
+                        metavar="MS",
+                        help="Milliseconds to wait for every replayed response")
+
+    # instrumentation
+    parser.add_argument("--instrument",
+                        action="store_true",
+                        help="Time fetches, widget building and redraws and "
+                             "show a summary on exit")
+
+    parser.add_argument("--trace-requests",
+                        metavar="LOG",
+                        help="Write a line to LOG for every request to GitHub, "
+                             "implies --instrument")
+
+    parser.add_argument("--profile",
+                        metavar="STATS",
+                        help="Profile the UI thread and write the pstats to STATS")
+
     args = parser.parse_args()
 
     # Coerce `args` to a dictionary
     return vars(args)
 
 
+def print_cache_stats():
+    stats = cache_stats()
+    for user_repo, size in stats.items():
+        print("%s\t%.1f KiB" % (user_repo, size / 1024))
+    print("total\t%.1f KiB" % (sum(stats.values()) / 1024))
+
+
 def main():
     args = read_arguments()
 
-    api = login()
+    if args['cache_stats']:
+        print_cache_stats()
+        exit(0)
+    elif args['clear_cache']:
+        for user_repo in clear_cache():
+            print("Kept the changes to %s not sent to GitHub yet" % user_repo)
+        exit(0)
+
+    if args['instrument'] or args['trace_requests']:
+        instrument.enable()
+
+    # The interface and the GitHub client take a while to import, they aren't
+    # needed for the options above
+    from .ui import UI
+    from .core import Shipit
+    from .auth import login, current_user
+    from .http import configure_session
+    from .fixtures import record, replay
+    from github3 import GitHub
+    from github3.repos import Repository
+
+    recorder = None
+    if args['replay']:
+        # No credentials are needed to answer from a fixture
+        api = GitHub()
+        configure_session(api._session)
+        replay(api._session, args['replay'], args['latency'] / 1000)
+    else:
+        api = login()
+        if args['record']:
+            recorder = record(api._session, args['record'])
+
+    if instrument.ENABLED:
+        instrument.trace_requests(api._session, args['trace_requests'])
 
     # Get the user and repository that we are we going to manage
     user_repo_arg = args['user/repository'].strip()
+    local = None
 
     if not user_repo_arg:
         remotes = get_remotes()
@@ -63,21 +144,49 @@ def main():
             exit(ERR_ORIGIN_REMOTE_NOT_FOUND)
 
         USER, REPO = extract_user_and_repo_from_remote(remote)
+
+        # We are in a clone, diffs can be computed locally unless the
+        # responses are replayed
+        if LOCAL_DIFFS and not args['replay']:
+            local = LocalRepository('origin')
     elif '/' in user_repo_arg:
         # Assume that we got a <username>/<repository>
         USER, REPO = user_repo_arg.split('/')
     else:
         # If a `/` isn't included, assume that it's the name of the repository
         # and the logged in user owns it
-        USER, REPO = str(api.user()), user_repo_arg
-
-    # fetch repo
-    repo = api.repository(USER, REPO)
+        USER, REPO = current_user(api), user_repo_arg
+
+    # The repository is fetched in the background, so the first frame is
+    # drawn without waiting for GitHub. Until it's cached its name is enough
+    # to show it and ask for its issues.
+    cache = Cache(USER, REPO)
+    repo = cache.repository(Repository, api)
+    if repo is None:
+        repo = Repository({'name': REPO,
+                           'owner': {'login': USER},
+                           'url': api._build_url('repos', USER, REPO)}, api)
 
     # create view
     ui = UI(repo)
 
     # create controller
-    shipit = Shipit(ui, repo)
-
-    shipit.start()
+    shipit = Shipit(ui, repo, local, cache)
+
+    profile = None
+    if args['profile']:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
+    try:
+        shipit.start()
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(args['profile'])
+        if instrument.ENABLED:
+            instrument.close()
+            print(instrument.summary(), file=sys.stderr)
@@ -7,9 +7,52 @@ KEY_EDIT = "e"
 KEY_COMMENT = "c"
 KEY_QUIT = "q"
 KEY_DIFF = "d"
+KEY_NEXT_FILE = "f"
+KEY_PREV_FILE = "F"
+KEY_NEXT_HUNK = "n"
+KEY_PREV_HUNK = "N"
+KEY_HUD = "P"
 
 DIVIDER = "─"
 
+# Hosts of GitHub Enterprise installations, besides the ones with "github" in
+# their name, whose remotes are recognized
+GITHUB_HOSTS = []
+
+# Threads doing the network requests and other blocking work
+WORKERS = 5
+
+# Seconds to wait for connecting to GitHub and for its responses
+HTTP_TIMEOUT = (5, 30)
+
+# Times a request failing temporarily is retried, waiting exponentially longer
+# from this many seconds
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+
+# Seconds to wait for the user to stop changing the filters before fetching
+FILTER_DEBOUNCE = 0.15
+
+# Bytes of compressed pull request diffs kept on disk for each repository
+DIFF_CACHE_SIZE = 256 * 1024 * 1024
+
+# Compute the diffs of pull requests with git when shipit is started from a
+# clone of the repository, instead of downloading them
+LOCAL_DIFFS = True
+
+# Seconds a git command may take before the diff is downloaded instead
+GIT_TIMEOUT = 60
+
+# Requests of the API rate limit kept for what the user does, background work
+# waits for the limit to be reset when fewer remain
+RATE_LIMIT_RESERVE = 100
+
+# Seconds the focus has to stay on an item before prefetching its neighbourhood
+PREFETCH_DELAY = 0.3
+
+# Seconds between updates of the performance numbers shown with ``KEY_HUD``
+HUD_INTERVAL = 1
+
 PALETTE = [
     ("header",    "light blue",      ""),
     ("title",     "light blue,bold",      ""),
@@ -32,4 +75,12 @@ PALETTE = [
     ("red_text", "dark red", ""),
     ("cyan_text", "dark cyan", ""),
     ("pull",   "yellow", ""),
+    ("pending", "black", "yellow"),
+    ("pending_text", "yellow", ""),
+    ("syntax_comment", "dark gray", ""),
+    ("syntax_string", "yellow", ""),
+    ("syntax_number", "light cyan", ""),
+    ("syntax_keyword", "light magenta", ""),
+    ("syntax_name", "light blue", ""),
+    ("hud", "white", "dark blue"),
 ]
@@ -1,21 +1,46 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import subprocess
 import tempfile
-import concurrent.futures
+from functools import partial
 
-from urwid import MainLoop, ExitMainLoop, MonitoredList
+from urwid import MainLoop, ExitMainLoop
+from github3.issues import Issue
+from github3.issues.comment import IssueComment
+from github3.issues.label import Label
+from github3.pulls import PullRequest, ReviewComment
+from github3.repos import Repository
 
 from .config import (
     PALETTE,
 
     KEY_OPEN_ISSUE, KEY_CLOSE_ISSUE, KEY_BACK, KEY_DETAIL, KEY_EDIT,
-    KEY_REOPEN_ISSUE, KEY_COMMENT, KEY_DIFF, KEY_QUIT,
+    KEY_REOPEN_ISSUE, KEY_COMMENT, KEY_DIFF, KEY_QUIT, KEY_HUD,
+
+    WORKERS, FILTER_DEBOUNCE, PREFETCH_DELAY, DIFF_CACHE_SIZE,
+    RATE_LIMIT_RESERVE, HUD_INTERVAL,
 )
 from .ui import time_since
-from .events import on
-from .models import is_issue, is_pull_request, is_open, is_closed
+from .executor import Executor, Token, USER, BACKGROUND
+from .ratelimit import RateLimit
+from .cache import Cache, DiffCache, DIFFS, conditional, conditional_pages
+from .sync import IssueSync
+from .store import ItemStore, item_key, snapshot, diff
+from .query import Query
+from .summary import PRSummaries
+from .prefetch import Prefetcher
+from .diff import DiffBuffer
+from .git import GitError
+from .highlight import Highlighter
+from .journal import (
+    Journal, CREATE, CLOSE, REOPEN, EDIT, COMMENT,
+    SENT, CONFLICT, OFFLINE,
+)
+from .events import on, set_scheduler, Debouncer
+from .instrument import timed, record, rss, hit_ratio
+from .models import is_issue, is_pull_request, is_closed, item_kind, iter_comments
 from .func import lines, unlines, both
 
 NEW_ISSUE = """
@@ -67,72 +92,192 @@ def format_comment(comment):
                                                           body=body,)
 
 
-# FIXME: don't use a workaround when `__eq__` is implemented
-def item_index(issues, item):
-    for index, issue in enumerate(issues):
-        if issue.id == item.id:
-            return index
-    else:
-        return -1
+def comments_key(issue_or_pr):
+    return '/'.join([item_kind(issue_or_pr), str(issue_or_pr.number), 'comments'])
 
 
-def step(first, last):
-    """Call ``first`` asynchronously, and then add ``last`` as a callback."""
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future = executor.submit(first)
-        future.add_done_callback(last)
+class IssuesAndPullRequests(list):
+    """
+    The issues and pull requests being shown.
 
+    They are read from ``cache`` first and then revalidated in the background
+    by ``executor``; the results are shown from the UI thread once they
+    arrive. The changes of the ``journal`` not sent yet are shown on them.
 
-class IssuesAndPullRequests(MonitoredList):
-    def __init__(self, repo):
-        self._issues = []
-        self._prs = []
+    Changes are notified to the change callback with a ``Delta``. All the
+    changes made while handling a batch of results are coalesced into a
+    single notification.
+    """
+    def __init__(self, repo, executor, cache, journal):
         self.repo = repo
+        self.executor = executor
+        self.cache = cache
+        self.journal = journal
+        self.issue_sync = IssueSync(repo, cache)
+
+        issues = journal.overlay(cache.items('issue', Issue, repo))
+        self.store = ItemStore(issues + cache.items('pull', PullRequest, repo))
+        self.view = ('issue', 'open')
+        self.query = Query()
+        self._notified = {}
+        self._notify_scheduled = False
+        self._on_change = lambda delta: None
+        self._on_progress = lambda fetch: None
+        self.fetch = None
 
     def show_open_issues(self, **kwargs):
-        del self[:]
-        self._append_open_issues()
-        step(self.fetch_open_issues, self._append_open_issues)
+        self.show('issue', 'open')
 
     def show_closed_issues(self, **kwargs):
-        del self[:]
-        self._append_closed_issues()
-        step(self.fetch_closed_issues, self._append_closed_issues)
+        self.show('issue', 'closed')
 
     def show_pull_requests(self, **kwargs):
-        del self[:]
-        self._append_pull_requests()
-        step(self.fetch_pull_requests, self._append_pull_requests)
+        self.show('pull', 'open')
+
+    def filter(self, query):
+        """Show the items of the current view matching the ``Query``."""
+        # The order is applied to the stored items, no need to fetch them
+        sorted_only = query._replace(sort=None) == self.query._replace(sort=None)
+        self.query = query
+        if sorted_only:
+            self.refresh()
+        else:
+            self.show(*self.view)
+
+    def show(self, kind, state):
+        """Show the items of ``kind`` in ``state`` matching the query."""
+        self.view = (kind, state)
+        self.refresh()
+
+        if kind == 'pull':
+            # Every open pull request is fetched, they aren't filtered by GitHub
+            self._fetch(Fetch('pull', state, 'pulls/open', True),
+                        self.fetch_pull_requests)
+        elif self.query.filtered:
+            self._fetch(Fetch('issue', state, self.query.key(state), True,
+                              self.query.criteria('issue')),
+                        partial(self.issue_sync.fetch, state, self.query))
+        else:
+            self._fetch(Fetch('issue', state, 'issues/' + state,
+                              self.issue_sync.is_complete(state)),
+                        partial(self.issue_sync.sync, state))
+
+    def update(self, item):
+        """Show the changes made to ``item``."""
+        if self.store.upsert(item):
+            self.refresh()
+
+    def refresh(self):
+        """Show the stored items that match the current view."""
+        kind, state = self.view
+        self[:] = self.store.select(self.query.sort,
+                                    kind=kind,
+                                    state=state,
+                                    **self.query.criteria(kind))
+
+        if not self._notify_scheduled:
+            self._notify_scheduled = True
+            self.executor.call_soon(self._notify)
+
+    def set_change_callback(self, callback):
+        """Call ``callback`` with a ``Delta`` when the items change."""
+        self._on_change = callback
+
+    def _notify(self):
+        self._notify_scheduled = False
+
+        delta = diff(self._notified, list(self))
+        if delta is not None:
+            self._notified = snapshot(self)
+            self._on_change(delta)
+
+    def set_progress_callback(self, callback):
+        """
+        Call ``callback`` with the ``Fetch`` in progress when a page of items
+        arrives and when it finishes.
+        """
+        self._on_progress = callback
+
+    def _fetch(self, fetch, pages):
+        """
+        Fetch the ``pages`` of items in the background, cancelling the fetch
+        in progress unless it's fetching the same items.
+        """
+        current = self.fetch
+        if current is not None and not current.done:
+            if current.key == fetch.key:
+                return
+            current.cancel()
+
+        self.fetch = fetch
+        # Revalidating the items shown can wait for the rate limit to be
+        # reset, the user is waiting for them when none are
+        self.executor.stream(pages,
+                             partial(self._on_page, fetch),
+                             partial(self._on_fetched, fetch),
+                             token=fetch,
+                             priority=BACKGROUND if len(self) else USER)
+
+    def _on_page(self, fetch, page):
+        fetch.add(page)
+        self.store.merge(self.journal.overlay(page.items))
+        self.refresh()
+        self._on_progress(fetch)
+
+    def _on_fetched(self, fetch, future):
+        fetch.done = True
+        fetch.failed = future.exception() is not None
+        record("fetch.%s.%s" % (fetch.kind, fetch.state),
+               time.perf_counter() - fetch.started)
+
+        # Drop the items that are no longer in the state or match the query
+        if future.exception() is None and fetch.complete and fetch.pages:
+            if self.store.retain(fetch.keys, kind=fetch.kind, state=fetch.state,
+                                 **fetch.criteria):
+                self.refresh()
+
+        self._on_progress(fetch)
+
+    # These run in a worker thread, don't touch shared state from them. They
+    # return an iterable with the pages of items that changed since the
+    # cached version.
 
     def fetch_pull_requests(self):
-        self._prs.extend([i for i in self.repo.iter_pulls()])
-
-    def fetch_open_issues(self):
-        self._issues.extend([i for i in self.repo.iter_issues() if not i.pull_request])
-
-    def fetch_closed_issues(self):
-        self._issues.extend([i for i in self.repo.iter_issues(state='closed')])
+        prs = []
+        for page in conditional_pages(self.cache, 'pulls/open',
+                                      partial(self.repo.iter_pulls, state='open')):
+            prs.extend(page.items)
+            yield page
+        self.cache.replace_items('pull', 'open', prs)
 
-    def _append_open_issues(self, future=None):
-        # FIXME: __eq__ is coming
-        for i in filter(is_open, self._issues):
-            index = item_index(self, i)
-            if index == -1:
-                self.append(i)
 
-    def _append_closed_issues(self, future=None):
-        # FIXME: __eq__ is coming
-        for i in filter(is_closed, self._issues):
-            index = item_index(self, i)
-            if index == -1:
-                self.append(i)
+class Fetch(Token):
+    """
+    A fetch of the items of ``kind`` in ``state`` from the listing cached
+    as ``key``, whose pages are merged into the store as they arrive.
 
-    def _append_pull_requests(self, future=None):
-        # FIXME: __eq__ is coming
-        for pr in self._prs:
-            index = item_index(self, pr)
-            if index == -1:
-                self.append(pr)
+    When ``complete`` it fetches all the items in ``state`` matching the
+    store ``criteria``, otherwise only the ones that changed. Cancelling it
+    stops the pagination and discards the pages not merged yet.
+    """
+    def __init__(self, kind, state, key, complete, criteria=None):
+        super().__init__()
+        self.kind = kind
+        self.state = state
+        self.key = key
+        self.complete = complete
+        self.criteria = criteria or {}
+        self.keys = set()
+        self.pages = 0
+        self.total = None
+        self.done = False
+        self.failed = False
+        self.started = time.perf_counter()
+
+    def add(self, page):
+        self.keys.update(item_key(item) for item in page.items)
+        self.pages += 1
+        self.total = page.total
 
 
 class Shipit():
@@ -141,18 +286,59 @@ class Shipit():
     PR_DETAIL = 2
     PR_DIFF = 3
 
-    def __init__(self, ui, repo):
+    def __init__(self, ui, repo, local=None, cache=None):
         self.ui = ui
         self.repo = repo
+        self.local = local
+        self.executor = Executor(WORKERS)
 
-        self.issues_and_prs = IssuesAndPullRequests(self.repo)
-        self.issues_and_prs.set_modified_callback(self.on_modify_issues_and_prs)
+        self.rate_limit = RateLimit(RATE_LIMIT_RESERVE)
+        self.rate_limit.watch(self.repo._session)
+        self.rate_limit.on_change(self.on_rate_limit)
+        self.executor.set_gate(self.rate_limit.delay)
+
+        self.cache = Cache(str(repo.owner), repo.name) if cache is None else cache
+        self.diffs = DiffCache(os.path.join(self.cache.path, DIFFS), DIFF_CACHE_SIZE)
+        self.mode = self.ISSUE_LIST
+        self.detail = None
+        self.last_redraw = None
+        self.hud_alarm = None
+
+        self.pr_summaries = PRSummaries(self.repo, self.executor)
+        self.pr_summaries.on_summary(self.on_pr_summary)
+        self.ui.set_pr_summaries(self.pr_summaries)
+        self.highlighter = Highlighter(self.executor)
+        self.ui.set_highlighter(self.highlighter)
+
+        self.prefetcher = Prefetcher(self.executor,
+                                     self.fresh_comments,
+                                     self.pr_summaries)
+
+        self.ui.set_labels(self.cache.labels(Label, self.repo))
+        self.executor.submit(self.fetch_labels, self.on_labels, priority=BACKGROUND)
+        self.executor.submit(self.fetch_milestones, self.on_milestones,
+                             priority=BACKGROUND)
+        self.executor.submit(self.fetch_repository, self.on_repository,
+                             priority=BACKGROUND)
+
+        self.journal = Journal(self.repo, self.cache, self.executor, self.schedule)
+        self.journal.on_sent(self.on_mutation_sent)
+
+        self.issues_and_prs = IssuesAndPullRequests(self.repo,
+                                                    self.executor,
+                                                    self.cache,
+                                                    self.journal)
+        self.issues_and_prs.set_change_callback(self.on_change_issues_and_prs)
+        self.issues_and_prs.set_progress_callback(self.on_fetch_progress)
         self.issues_and_prs.show_open_issues()
 
         # Event handlers
-        on("show_open_issues", self.issues_and_prs.show_open_issues)
-        on("show_closed_issues", self.issues_and_prs.show_closed_issues)
-        on("show_pull_requests", self.issues_and_prs.show_pull_requests)
+        filters = Debouncer(FILTER_DEBOUNCE)
+        on("show_open_issues", filters.wrap(self.issues_and_prs.show_open_issues))
+        on("show_closed_issues", filters.wrap(self.issues_and_prs.show_closed_issues))
+        on("show_pull_requests", filters.wrap(self.issues_and_prs.show_pull_requests))
+        on("filter_items", Debouncer(FILTER_DEBOUNCE).wrap(self.issues_and_prs.filter))
+        on("focus_item", Debouncer(PREFETCH_DELAY).wrap(self.prefetcher.focus))
 
     def start(self):
         self.issue_list()
@@ -161,26 +347,323 @@ class Shipit():
                              PALETTE,
                              handle_mouse=True,
                              unhandled_input=self.handle_keypress)
-        self.loop.run()
-
-    def on_modify_issues_and_prs(self):
-        self.ui.issues_and_pulls(self.issues_and_prs)
+        self.loop.draw_screen = partial(self.draw_screen,
+                                        timed("ui.redraw")(self.loop.draw_screen))
+        self.executor.attach(self.loop)
+        set_scheduler(self.schedule)
+        self.show_journal()
+        self.journal.replay()
+        try:
+            self.loop.run()
+        finally:
+            self.executor.detach()
+
+    def on_change_issues_and_prs(self, delta):
+        # Results arriving in the background mustn't take the user away from
+        # what they are reading
+        if self.mode is self.ISSUE_LIST:
+            self.ui.update_issues_and_pulls(delta)
+
+    def draw_screen(self, draw):
+        start = time.perf_counter()
+        draw()
+        self.last_redraw = time.perf_counter() - start
+
+    def schedule(self, delay, callback):
+        """
+        Call ``callback`` on the UI thread after ``delay`` seconds, returning
+        the handle of the alarm.
+        """
+        return self.loop.set_alarm_in(delay, lambda loop, data: callback())
+
+    def on_rate_limit(self, rate_limit):
+        # Called from the thread that made the request
+        self.executor.call_soon(lambda: self.ui.set_status("quota", str(rate_limit)))
+
+    def on_fetch_progress(self, fetch):
+        if fetch.done:
+            self.ui.loading(None, None)
+            self.ui.set_status("offline", "Offline" if fetch.failed else None)
+        else:
+            self.ui.loading(fetch.pages, fetch.total)
 
     def issue_list(self):
         self.mode = self.ISSUE_LIST
+        self.detail = None
         self.ui.issues_and_pulls(self.issues_and_prs)
 
     def issue_detail(self, issue):
         self.mode = self.ISSUE_DETAIL
-        self.ui.issue(issue)
+        self.detail = issue
+        self.ui.issue(issue, self.comments(issue), *self.pending_changes(issue))
 
     def pull_request_detail(self, pr):
         self.mode = self.PR_DETAIL
-        self.ui.pull_request(pr)
+        self.detail = pr
+        self.ui.pull_request(pr, self.comments(pr), self.pr_summaries.get(pr))
+        self.pr_summaries.request(pr)
+
+    # -- Cached data ----------------------------------------------------------
+
+    def comments(self, issue_or_pr):
+        """
+        Return the comments of ``issue_or_pr`` from memory if they were
+        prefetched. Otherwise return the cached ones and revalidate them in
+        the background.
+        """
+        comments = self.prefetcher.get_comments(issue_or_pr)
+        if comments is None:
+            comments = self.cached_comments(issue_or_pr)
+            self.executor.submit(self.fetch_comments,
+                                 partial(self.on_comments, issue_or_pr),
+                                 issue_or_pr)
+        return comments
+
+    def known_comments(self, issue_or_pr):
+        """Return the comments of ``issue_or_pr`` without fetching them."""
+        comments = self.prefetcher.get_comments(issue_or_pr)
+        if comments is None:
+            comments = self.cached_comments(issue_or_pr)
+        return comments
+
+    def cached_comments(self, issue_or_pr):
+        if is_pull_request(issue_or_pr):
+            cls = ReviewComment
+        else:
+            cls = IssueComment
+        return self.cache.comments(comments_key(issue_or_pr), cls, self.repo)
+
+    @timed("fetch.comments")
+    def fetch_comments(self, issue_or_pr):
+        key = comments_key(issue_or_pr)
+        comments = conditional(self.cache, key, partial(iter_comments, issue_or_pr))
+        if comments is not None:
+            self.cache.set_comments(key, comments)
+        return comments
+
+    def fresh_comments(self, issue_or_pr):
+        """Return the up to date comments of ``issue_or_pr``."""
+        comments = self.fetch_comments(issue_or_pr)
+        if comments is None:
+            comments = self.cached_comments(issue_or_pr)
+        return comments
+
+    def on_comments(self, issue_or_pr, future):
+        if future.exception() is not None:
+            return
+
+        comments = future.result()
+        if comments is None:
+            return
+
+        self.prefetcher.set_comments(issue_or_pr, comments)
+        # The detail may show a copy of it with the changes not sent yet
+        if self.detail is None or item_key(self.detail) != item_key(issue_or_pr):
+            return
+
+        if self.mode in (self.ISSUE_DETAIL, self.PR_DETAIL):
+            self.ui.update_comments(issue_or_pr, comments)
+
+    def on_pr_summary(self, pr):
+        if self.mode is self.PR_DETAIL and self.detail is pr:
+            self.ui.update_pr_summary(pr, self.pr_summaries.get(pr))
+
+    def fetch_repository(self):
+        # Runs in a worker thread, a new copy is fetched so the one the UI is
+        # reading isn't changed under it
+        json = self.repo._json(self.repo._get(self.repo._api), 200)
+        if not json:
+            return None
+        repo = Repository(json, self.repo)
+        self.cache.set_repository(repo)
+        return repo
+
+    def on_repository(self, future):
+        if future.exception() is not None or future.result() is None:
+            return
+
+        # The rest only use it to make requests, which the old copy still can
+        self.repo = future.result()
+        self.ui.set_repository(self.repo)
+
+    @timed("fetch.labels")
+    def fetch_labels(self):
+        labels = conditional(self.cache, 'labels', self.repo.iter_labels)
+        if labels is not None:
+            self.cache.set_labels(labels)
+        return labels
+
+    def on_labels(self, future):
+        if future.exception() is not None:
+            return
+
+        labels = future.result()
+        if labels is not None:
+            self.ui.set_labels(labels)
+
+    @timed("fetch.milestones")
+    def fetch_milestones(self):
+        return list(self.repo.iter_milestones())
+
+    def on_milestones(self, future):
+        if future.exception() is not None:
+            return
+
+        self.ui.set_milestones(future.result())
 
     def diff(self, pr):
         self.mode = self.PR_DIFF
         self.ui.diff(pr)
+        self.executor.submit(self.fetch_diff, partial(self.on_diff, pr), pr)
+
+    @timed("fetch.diff")
+    def fetch_diff(self, pr):
+        # Runs in a worker thread, indexing a big diff takes a while too
+        base, head = pr.base.sha, pr.head.sha
+
+        raw = self.diffs.get(base, head)
+        if raw is None:
+            raw = self.fetch_raw_diff(pr)
+            self.diffs.put(base, head, raw)
+
+        return DiffBuffer(raw), self.fetch_diff_stats(pr)
+
+    def fetch_raw_diff(self, pr):
+        if self.local is not None:
+            try:
+                return self.local.diff(pr)
+            except GitError:
+                # Not reachable from the local clone, ask GitHub
+                pass
+        return pr.diff()
+
+    def fetch_diff_stats(self, pr):
+        if self.local is None:
+            return None
+        try:
+            return self.local.numstat(pr)
+        except GitError:
+            return None
+
+    def on_diff(self, pr, future):
+        if self.mode is not self.PR_DIFF or self.detail is not pr:
+            return
+
+        if future.exception() is None:
+            diff, stats = future.result()
+            self.ui.diff(pr, diff, stats=stats)
+        else:
+            self.ui.diff(pr, message="Couldn't fetch the diff")
+
+    # -- HUD ------------------------------------------------------------------
+
+    def toggle_hud(self):
+        # Showing it again mustn't start another chain of updates
+        if self.hud_alarm is not None:
+            self.loop.remove_alarm(self.hud_alarm)
+            self.hud_alarm = None
+
+        self.ui.toggle_hud()
+        if self.ui.hud is not None:
+            self.update_hud()
+
+    def update_hud(self):
+        # Keeps updating itself while the HUD is shown
+        self.hud_alarm = None
+        if self.ui.hud is None:
+            return
+        self.ui.set_hud(self.hud_stats())
+        self.hud_alarm = self.schedule(HUD_INTERVAL, self.update_hud)
+
+    def hud_stats(self):
+        """Return the ``(name, value)`` pairs to show in the HUD."""
+        running, queued = self.executor.load()
+        widgets = self.ui.widget_counts()
+        redraw = self.last_redraw
+        return [
+            ("work", "%s running, %s queued" % (running, queued)),
+            ("quota", str(self.rate_limit) or "-"),
+            ("etags", hit_ratio(self.cache)),
+            ("diffs", hit_ratio(self.diffs)),
+            ("highlight", hit_ratio(self.highlighter)),
+            ("comments", hit_ratio(self.prefetcher)),
+            ("summaries", hit_ratio(self.pr_summaries)),
+            ("widgets", ", ".join("%s %s" % item for item in widgets.items()) or "-"),
+            ("redraw", "%.1fms" % (redraw * 1000) if redraw is not None else "-"),
+            ("memory", "%.1f MiB" % (rss() / 2 ** 20)),
+        ]
+
+    # -- Changes --------------------------------------------------------------
+
+    def change(self, issue):
+        """Show the changes made locally to ``issue`` while they are sent."""
+        if self.mode is self.ISSUE_DETAIL and self.detail.number == issue.number:
+            self.detail = issue
+        self.issues_and_prs.update(issue)
+        comments, sending = self.pending_changes(issue)
+        self.ui.update_issue(issue, sending, comments)
+
+    def pending_changes(self, issue):
+        """
+        Return the comments on ``issue`` not sent yet and whether it has
+        changes not sent.
+        """
+        pending = self.journal.pending_for(issue)
+        comments = [m.data['body'] for m in pending if m.action == COMMENT]
+        return comments, bool(pending)
+
+    def on_mutation_sent(self, mutation, outcome, issue):
+        self.show_journal(mutation, outcome)
+        if outcome is OFFLINE:
+            return
+
+        if issue is None:
+            # Rejected, go back to the issue as it was fetched
+            issue = self.fetched_issue(mutation.number)
+            if issue is None:
+                return
+        else:
+            self.cache.put_items('issue', [issue])
+
+        # The changes made after this one are still to be sent
+        issue, = self.journal.overlay([issue])
+
+        shown = self.mode is self.ISSUE_DETAIL and self.detail.number == issue.number
+        self.change(issue)
+
+        if shown and mutation.action == COMMENT:
+            self.executor.submit(self.fetch_comments,
+                                 partial(self.on_comments, issue),
+                                 issue)
+
+    def fetched_issue(self, number):
+        for item in self.issues_and_prs.store.select(kind='issue'):
+            if item.number == number:
+                return self.cache.item('issue', item.id, Issue, self.repo)
+        return None
+
+    def show_journal(self, mutation=None, outcome=None):
+        """Show the changes not sent yet and what became of ``mutation``."""
+        pending = len(self.journal.pending)
+        if pending == 1:
+            self.ui.set_status("journal", "1 change not sent")
+        elif pending:
+            self.ui.set_status("journal", "%s changes not sent" % pending)
+        else:
+            self.ui.set_status("journal")
+
+        self.ui.set_status("offline", "Offline" if self.journal.offline else None)
+
+        if mutation is None or outcome is OFFLINE:
+            return
+
+        issue = "#%s" % mutation.number if mutation.number else "The new issue"
+        if outcome is SENT:
+            self.ui.set_status("sent")
+        elif outcome is CONFLICT:
+            self.ui.set_status("sent", "%s changed on GitHub, change discarded" % issue)
+        else:
+            self.ui.set_status("sent", "%s couldn't be changed" % issue)
 
     def handle_keypress(self, key):
         #  R: reopen
@@ -200,27 +683,25 @@ class Shipit():
                     return
                 body = lines(body)
 
-                issue = self.repo.create_issue(title=title, body=body)
-                if issue:
-                    self.issue_detail(issue)
+                # It's shown once GitHub creates it
+                self.journal.record(CREATE, title=title, body=body)
+                self.show_journal()
         elif key == KEY_CLOSE_ISSUE:
             issue = self.ui.get_issue()
 
             if not issue:
                 return
 
-            issue.close()
-
-            if self.mode is self.ISSUE_DETAIL:
-                self.issue_detail(issue)
+            issue = self.journal.record(CLOSE, issue, old_state=issue.state)
+            self.show_journal()
+            self.change(issue)
         elif key == KEY_REOPEN_ISSUE:
             issue = self.ui.get_issue()
 
             if issue and is_closed(issue):
-                issue.reopen()
-
-            if self.mode is self.ISSUE_DETAIL:
-                self.issue_detail(issue)
+                issue = self.journal.record(REOPEN, issue, old_state=issue.state)
+                self.show_journal()
+                self.change(issue)
         elif key == KEY_BACK:
             if self.mode is self.PR_DIFF:
                 pr = self.ui.get_focused_item()
@@ -256,19 +737,18 @@ class Shipit():
                 return
             body = lines(body)
 
-            issue.edit(title=title, body=body)
-
-            if self.mode is self.ISSUE_LIST:
-                self.issue_list()
-            elif self.mode is self.ISSUE_DETAIL:
-                self.issue_detail(issue)
+            issue = self.journal.record(EDIT, issue,
+                                        title=title, body=body,
+                                        old_title=issue.title, old_body=issue.body)
+            self.show_journal()
+            self.change(issue)
         elif key == KEY_COMMENT:
             issue = self.ui.get_issue()
             if issue is None:
                 return
 
             # Inline all the thread comments
-            issue_thread = [format_comment(comment) for comment in issue.iter_comments()]
+            issue_thread = [format_comment(comment) for comment in self.known_comments(issue)]
             issue_thread.insert(0,'\n\n'.join([issue.title, issue.body_text, '']))
             # Make the whole thread a comment
             issue_thread.insert(0, '<!---\n')
@@ -285,9 +765,11 @@ class Shipit():
                 # TODO: invalid input
                 return
 
-            issue.create_comment(comment_text)
-
-            self.issue_detail(issue)
+            issue = self.journal.record(COMMENT, issue, body=comment_text)
+            self.show_journal()
+            self.change(issue)
+        elif key == KEY_HUD:
+            self.toggle_hud()
         elif key == KEY_QUIT:
             raise ExitMainLoop
         elif key == KEY_DIFF:
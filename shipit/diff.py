@@ -0,0 +1,114 @@
+"""
+shipit.diff
+~~~~~~~~~~~
+
+Random access to the lines, files and hunks of large unified diffs.
+"""
+
+import re
+import mmap
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Diffs bigger than this many bytes are kept in a memory-mapped temporary file
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+FILE_HEADER = b'diff --git '
+
+NEWLINE = re.compile(b'\n')
+HEADER = re.compile(b'^(?:diff --git |@@)', re.MULTILINE)
+
+
+def buffer_for(raw):
+    """
+    Return a buffer with the ``raw`` diff bytes, memory-mapped from a
+    temporary file if it's big.
+    """
+    if len(raw) < MMAP_THRESHOLD:
+        return raw
+
+    tmp_file = tempfile.TemporaryFile()
+    tmp_file.write(raw)
+    tmp_file.flush()
+    # The file is deleted when closed, the mapping keeps it alive
+    buf = mmap.mmap(tmp_file.fileno(), 0, access=mmap.ACCESS_READ)
+    tmp_file.close()
+    return buf
+
+
+class DiffBuffer():
+    """
+    A unified diff kept as raw bytes, indexed when created by the offset
+    where every line starts and by the lines where every file and hunk
+    starts. Lines are decoded when they are asked for.
+    """
+    def __init__(self, raw):
+        self.buf = buffer_for(raw)
+        self.size = len(raw)
+
+        # The offset of the start of each line plus the end of the buffer
+        self.offsets = array('Q', [0])
+        self.files = []
+        self.hunks = []
+
+        self._index()
+
+    def _index(self):
+        buf, offsets = self.buf, self.offsets
+        for match in NEWLINE.finditer(buf):
+            offsets.append(match.end())
+
+        if offsets[-1] != self.size:
+            # The last line has no newline
+            offsets.append(self.size)
+
+        for match in HEADER.finditer(buf):
+            number = bisect_right(offsets, match.start()) - 1
+            if match.group() == FILE_HEADER:
+                self.files.append(number)
+            else:
+                self.hunks.append(number)
+
+    def __len__(self):
+        """Return the number of lines."""
+        return len(self.offsets) - 1
+
+    def line(self, number):
+        """Return the line ``number`` without its line break."""
+        start, end = self.offsets[number], self.offsets[number + 1]
+        return bytes(self.buf[start:end]).rstrip(b'\r\n').decode('utf-8', 'replace')
+
+    def file_of(self, number):
+        """Return the index in ``files`` of the file line ``number`` is in."""
+        return bisect_right(self.files, number) - 1
+
+    def file_lines(self, index):
+        """Return the first and past the last line numbers of file ``index``."""
+        start = self.files[index]
+        end = self.files[index + 1] if index + 1 < len(self.files) else len(self)
+        return start, end
+
+    def next_file(self, number):
+        return self._next(self.files, number)
+
+    def prev_file(self, number):
+        return self._prev(self.files, number)
+
+    def next_hunk(self, number):
+        return self._next(self.hunks, number)
+
+    def prev_hunk(self, number):
+        return self._prev(self.hunks, number)
+
+    @staticmethod
+    def _next(starts, number):
+        """Return the first of ``starts`` after ``number``, or ``None``."""
+        index = bisect_right(starts, number)
+        return starts[index] if index < len(starts) else None
+
+    @staticmethod
+    def _prev(starts, number):
+        """Return the last of ``starts`` before ``number``, or ``None``."""
+        index = bisect_left(starts, number)
+        return starts[index - 1] if index > 0 else None
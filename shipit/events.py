@@ -5,10 +5,14 @@ shipit.events
 Poor mans pub-sub mechanism.
 """
 
+import time
+
 EVENTS = [
  'show_open_issues',
  'show_closed_issues',
  'show_pull_requests',
+ 'filter_items',
+ 'focus_item',
 ]
 
 
@@ -28,3 +32,53 @@ def on(event, callback):
         raise ValueError("%s is not a valid event." % event)
 
 
+
+
+# Function for calling a callback after a delay in seconds, with the signature
+# ``schedule(delay, callback)``. Set with ``set_scheduler`` once there is a
+# main loop; until then callbacks aren't delayed.
+SCHEDULER = None
+
+def set_scheduler(schedule):
+    global SCHEDULER
+    SCHEDULER = schedule
+
+
+class Debouncer():
+    """
+    Coalesce bursts of calls to the callbacks it wraps: only the last call is
+    made, once ``wait`` seconds passed without any other.
+
+    Wrap the handlers of events that supersede each other with the same
+    debouncer, e.g. ``on(event, debouncer.wrap(callback))``.
+    """
+    def __init__(self, wait):
+        self.wait = wait
+        self._call = None
+        self._last = 0
+        self._scheduled = False
+
+    def wrap(self, callback):
+        return lambda *args, **kwargs: self.call(callback, *args, **kwargs)
+
+    def call(self, callback, *args, **kwargs):
+        if SCHEDULER is None:
+            callback(*args, **kwargs)
+            return
+
+        self._call = lambda: callback(*args, **kwargs)
+        self._last = time.time()
+        if not self._scheduled:
+            self._scheduled = True
+            SCHEDULER(self.wait, self._fire)
+
+    def _fire(self):
+        remaining = self._last + self.wait - time.time()
+        if remaining > 0:
+            # Called again since it was scheduled
+            SCHEDULER(remaining, self._fire)
+            return
+
+        self._scheduled = False
+        call, self._call = self._call, None
+        call()
@@ -0,0 +1,257 @@
+"""
+shipit.executor
+~~~~~~~~~~~~~~~
+
+Run blocking work in background threads and deliver the results back to the
+urwid ``MainLoop``.
+"""
+
+import os
+import heapq
+import queue
+import itertools
+import threading
+import concurrent.futures
+
+# Priorities of the work, from the most to the least urgent: what the user
+# is waiting for, work that doesn't make requests and the rest
+USER = 0
+LOCAL = 1
+BACKGROUND = 2
+
+
+class Token():
+    """
+    A cancellation token for work submitted to an ``Executor``.
+
+    Once cancelled, the results of the work are discarded and streams stop.
+    """
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Executor():
+    """
+    A long-lived thread pool whose callbacks are called on the UI thread.
+
+    Work submitted with ``submit`` runs in a worker thread. When it finishes,
+    its callback is queued and the ``MainLoop`` is woken up through a watch
+    pipe, so callbacks never run concurrently with the UI.
+
+    Callbacks queued before the executor is attached to a loop are delivered
+    as soon as it is.
+
+    Work waiting for a worker is started in order of priority, ``USER``
+    before ``LOCAL`` before ``BACKGROUND``. The ``gate`` may hold work back: it's called with
+    the priority of the next work and returns the seconds to wait before
+    starting it.
+    """
+    def __init__(self, max_workers=5):
+        self.max_workers = max_workers
+        self._pending = []
+        self._running = 0
+        self._count = itertools.count()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._shutdown = False
+        self._gate = None
+        self._done = queue.Queue()
+        self._lock = threading.Lock()
+        self._woken = False
+        self._loop = None
+        self._pipe = None
+
+    def attach(self, loop):
+        """Deliver the results of finished work to ``loop``."""
+        self._loop = loop
+        self._pipe = loop.watch_pipe(self._on_wakeup)
+
+        # Wake up for anything that finished before we had a loop
+        self._wakeup()
+
+    def detach(self):
+        """Stop delivering results and let running work finish on its own."""
+        with self._lock:
+            if self._pipe is not None:
+                self._loop.remove_watch_pipe(self._pipe)
+                os.close(self._pipe)
+            self._loop = self._pipe = None
+
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+    def set_gate(self, gate):
+        """Hold work back for the seconds ``gate(priority)`` returns."""
+        with self._condition:
+            self._gate = gate
+            self._condition.notify_all()
+
+    def submit(self, fn, callback=None, *args, token=None, priority=USER, **kwargs):
+        """
+        Call ``fn(*args, **kwargs)`` in a worker thread.
+
+        When it finishes, ``callback`` is called on the UI thread with the
+        ``concurrent.futures.Future`` holding the outcome, unless ``token``
+        was cancelled by then. Work whose ``token`` is cancelled before it
+        starts is never run.
+        """
+        if token is not None and token.cancelled:
+            return None
+
+        future = concurrent.futures.Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: self._deliver(callback, f, token))
+
+        with self._condition:
+            work = (fn, args, kwargs, future, token)
+            heapq.heappush(self._pending, (priority, next(self._count), work))
+            if len(self._workers) < self.max_workers:
+                self._start_worker()
+            self._condition.notify()
+
+        return future
+
+    def stream(self, fn, callback, done=None, *args, token=None, priority=USER, **kwargs):
+        """
+        Iterate over ``fn(*args, **kwargs)`` in a worker thread.
+
+        ``callback`` is called on the UI thread with every value as soon as
+        it's produced, and ``done`` with the ``concurrent.futures.Future``
+        of the whole iteration once it finishes.
+
+        When ``token`` is cancelled the iteration stops before asking for the
+        next value, and the values not delivered yet are discarded. The
+        ``gate`` is asked before every value too.
+        """
+        def consume():
+            values = iter(fn(*args, **kwargs))
+            try:
+                while token is None or not token.cancelled:
+                    self._wait_gate(priority)
+                    try:
+                        value = next(values)
+                    except StopIteration:
+                        break
+                    self._deliver(lambda future, value=value: callback(value),
+                                  None,
+                                  token)
+            finally:
+                if hasattr(values, 'close'):
+                    values.close()
+
+        return self.submit(consume, done, token=token, priority=priority)
+
+    def call_soon(self, callback):
+        """
+        Call ``callback`` on the UI thread once the callbacks already queued
+        have been called.
+        """
+        self._deliver(lambda future: callback(), None)
+
+    def run_pending(self):
+        """Call the callbacks of all the work finished so far."""
+        with self._lock:
+            self._woken = False
+
+        while True:
+            try:
+                callback, future, token = self._done.get_nowait()
+            except queue.Empty:
+                break
+            if token is None or not token.cancelled:
+                callback(future)
+
+    def load(self):
+        """Return the number of works running and waiting to start."""
+        with self._condition:
+            return self._running, len(self._pending)
+
+    def idle(self):
+        """
+        Return whether there's no work waiting, running or with callbacks
+        left to call.
+        """
+        with self._condition:
+            busy = self._pending or self._running
+        # The callbacks of finished work are queued before it stops running
+        return not busy and self._done.empty()
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self._work, daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _delay(self, priority):
+        return self._gate(priority) if self._gate is not None else 0
+
+    def _wait_gate(self, priority):
+        with self._condition:
+            delay = self._delay(priority)
+            while delay > 0 and not self._shutdown:
+                self._condition.wait(delay)
+                delay = self._delay(priority)
+
+    def _next_work(self):
+        """Wait for the next work allowed to start, ``None`` on shutdown."""
+        with self._condition:
+            while not self._shutdown:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+
+                priority, _, work = self._pending[0]
+                delay = self._delay(priority)
+                if delay > 0:
+                    # Urgent work may arrive meanwhile
+                    self._condition.wait(delay)
+                    continue
+
+                heapq.heappop(self._pending)
+                self._running += 1
+                return work
+
+    def _work(self):
+        while True:
+            work = self._next_work()
+            if work is None:
+                return
+
+            try:
+                self._run(*work)
+            finally:
+                with self._condition:
+                    self._running -= 1
+
+    def _run(self, fn, args, kwargs, future, token):
+        if token is not None and token.cancelled:
+            future.cancel()
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _deliver(self, callback, future, token=None):
+        self._done.put((callback, future, token))
+        self._wakeup()
+
+    def _wakeup(self):
+        # Only one pending write to the pipe is needed to drain the queue
+        with self._lock:
+            if self._pipe is None or self._woken:
+                return
+            self._woken = True
+            os.write(self._pipe, b"!")
+
+    def _on_wakeup(self, data):
+        self.run_pending()
+        # Keep watching the pipe
+        return True
@@ -0,0 +1,200 @@
+"""
+shipit.fixtures
+~~~~~~~~~~~~~~~
+
+Record the requests made to GitHub and their responses to a fixture file,
+and answer the requests of later sessions from it without network access.
+
+A fixture is a gzipped file with a JSON object per line for every request.
+"""
+
+import json
+import gzip
+import time
+import threading
+from base64 import b64encode, b64decode
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+NOT_MODIFIED = 304
+NOT_FOUND = 404
+
+# The request headers that change the response, no credentials are stored
+REQUEST_HEADERS = ('Accept', 'If-None-Match')
+
+# Response headers that describe the raw response, not its decoded content
+TRANSPORT_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding',
+                     'Connection', 'Set-Cookie')
+
+
+def request_key(method, url, accept):
+    """
+    Return what identifies a request: its ``method``, its ``url`` with the
+    query parameters sorted and the media type it ``accept``s.
+    """
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return method, urlunsplit((scheme, netloc, path, query, '')), accept
+
+
+def encode_body(content):
+    try:
+        return {'body': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_base64': b64encode(content).decode('ascii')}
+
+
+def decode_body(exchange):
+    if 'body_base64' in exchange:
+        return b64decode(exchange['body_base64'])
+    return exchange.get('body', '').encode('utf-8')
+
+
+class Recorder():
+    """Append every request and its response to the fixture in ``path``."""
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, request, response):
+        exchange = {
+            'method': request.method,
+            'url': request.url,
+            'request_headers': dict((name, request.headers[name])
+                                    for name in REQUEST_HEADERS
+                                    if name in request.headers),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict((name, value)
+                            for name, value in response.headers.items()
+                            if name not in TRANSPORT_HEADERS),
+        }
+        # The content is decompressed already
+        exchange.update(encode_body(response.content))
+
+        line = json.dumps(exchange, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            # A session that crashes keeps what it recorded
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingAdapter(BaseAdapter):
+    """Send the requests with ``adapter`` and record them with ``recorder``."""
+    def __init__(self, adapter, recorder):
+        super().__init__()
+        self.adapter = adapter
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        response = self.adapter.send(request, **kwargs)
+        self.recorder.record(request, response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answer requests with the responses recorded in a fixture, each after
+    ``latency`` seconds.
+
+    The responses recorded for the same request are given in order, and the
+    last one from then on. A conditional request for the ETag of the
+    response is answered with "Not Modified" like GitHub does; requests that
+    weren't recorded get a "Not Found".
+    """
+    def __init__(self, path, latency=0):
+        super().__init__()
+        self.latency = latency
+        self.responses = {}
+        self._served = {}
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                exchange = json.loads(line)
+                key = request_key(exchange['method'],
+                                  exchange['url'],
+                                  exchange['request_headers'].get('Accept', None))
+                self.responses.setdefault(key, []).append(exchange)
+
+        for key, exchanges in self.responses.items():
+            # A recorded "Not Modified" is only useful when there's nothing else
+            complete = [e for e in exchanges if e['status'] != NOT_MODIFIED]
+            self.responses[key] = complete or exchanges
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        key = request_key(request.method,
+                          request.url,
+                          request.headers.get('Accept', None))
+        with self._lock:
+            exchanges = self.responses.get(key, None)
+            if exchanges is None:
+                return self.build_response(request, NOT_FOUND, 'Not Found', {},
+                                           b'{"message": "Not recorded"}')
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+
+        exchange = exchanges[min(served, len(exchanges) - 1)]
+        headers = exchange['headers']
+        etag = request.headers.get('If-None-Match', None)
+        if etag is not None and etag == headers.get('ETag', None):
+            return self.build_response(request, NOT_MODIFIED, 'Not Modified',
+                                       headers, b'')
+
+        return self.build_response(request,
+                                   exchange['status'],
+                                   exchange['reason'],
+                                   headers,
+                                   decode_body(exchange))
+
+    def build_response(self, request, status, reason, headers, content):
+        response = Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+def record(session, path):
+    """
+    Record the requests ``session`` makes to the fixture in ``path``,
+    returning the ``Recorder`` to close when done.
+    """
+    recorder = Recorder(path)
+    for prefix, adapter in list(session.adapters.items()):
+        session.mount(prefix, RecordingAdapter(adapter, recorder))
+    return recorder
+
+
+def replay(session, path, latency=0):
+    """
+    Answer the requests ``session`` makes with the fixture in ``path``,
+    after ``latency`` seconds.
+    """
+    adapter = ReplayAdapter(path, latency)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
@@ -1,7 +1,248 @@
 import os
-import tempfile
+import re
 import subprocess
+from collections import namedtuple
+from urllib.parse import urlparse
 
+from .config import GITHUB_HOSTS, GIT_TIMEOUT
+
+
+def find_git_dir(path=None):
+    """
+    Return the git directory of the repository ``path`` is in, walking up
+    from the current directory by default, or ``None``.
+
+    Linked worktrees and submodules have a ``.git`` file pointing to their
+    git directory.
+    """
+    path = os.path.abspath(path or os.getcwd())
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        elif os.path.isfile(dot_git):
+            with open(dot_git) as f:
+                content = f.read().strip()
+            if content.startswith('gitdir:'):
+                git_dir = content[len('gitdir:'):].strip()
+                return os.path.normpath(os.path.join(path, git_dir))
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def common_dir(git_dir):
+    """Return the directory shared by all the worktrees of ``git_dir``."""
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+# -- Configuration ------------------------------------------------------------
+
+SECTION = re.compile(r'''^\[\s*([^\s"\]]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]''')
+ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '"': '"', '\\': '\\'}
+
+
+def parse_value(raw):
+    """Return the value of a configuration variable without quotes or comments."""
+    value, quoted, escaped = [], False, False
+    for char in raw:
+        if escaped:
+            value.append(ESCAPES.get(char, char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char in '#;' and not quoted:
+            break
+        else:
+            value.append(char)
+    return ''.join(value).strip()
+
+
+def parse_config(text):
+    """
+    Yield a ``(section, subsection, key, value)`` tuple for every variable
+    of a git configuration file.
+
+    Sections and keys are lowercased, they aren't case sensitive.
+    """
+    section = subsection = None
+    lines = iter(text.splitlines())
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+
+        match = SECTION.match(line)
+        if match:
+            section, subsection = match.groups()
+            if subsection is None and '.' in section:
+                # The deprecated ``[section.subsection]`` syntax
+                section, subsection = section.split('.', 1)
+            section = section.lower()
+            line = line[match.end():].strip()
+            if not line or line[0] in '#;':
+                continue
+
+        key, _, raw = line.partition('=')
+        # Lines ending with a backslash continue in the next one
+        while raw.endswith('\\') and not raw.endswith('\\\\'):
+            raw = raw[:-1] + next(lines, '')
+
+        # A key without value is a boolean
+        value = parse_value(raw) if _ else 'true'
+        yield section, subsection, key.strip().lower(), value
+
+
+def wildmatch(pattern, path):
+    """Match ``path`` against a pattern where ``**`` spans directories."""
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**/', index):
+            regex += '(?:.*/)?'
+            index += 3
+        elif pattern.startswith('**', index):
+            regex += '.*'
+            index += 2
+        elif pattern[index] == '*':
+            regex += '[^/]*'
+            index += 1
+        elif pattern[index] == '?':
+            regex += '[^/]'
+            index += 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return re.fullmatch(regex, path) is not None
+
+
+def gitdir_matches(pattern, config_file, git_dirs, ignore_case=False):
+    """Return whether one of ``git_dirs`` satisfies an ``includeIf`` condition."""
+    if pattern.startswith('./'):
+        pattern = os.path.join(os.path.dirname(config_file), pattern[2:])
+    pattern = os.path.expanduser(pattern)
+    if not os.path.isabs(pattern):
+        pattern = '**/' + pattern
+    if pattern.endswith('/'):
+        pattern += '**'
+
+    for git_dir in git_dirs:
+        for path in (git_dir, os.path.realpath(git_dir)):
+            if ignore_case and wildmatch(pattern.lower(), path.lower()):
+                return True
+            elif wildmatch(pattern, path):
+                return True
+    return False
+
+
+def current_branch(git_dir):
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    prefix = 'ref: refs/heads/'
+    return head[len(prefix):] if head.startswith(prefix) else None
+
+
+def include_applies(condition, config_file, git_dir):
+    kind, _, pattern = condition.partition(':')
+    git_dirs = [git_dir, common_dir(git_dir)]
+    if kind == 'gitdir':
+        return gitdir_matches(pattern, config_file, git_dirs)
+    elif kind == 'gitdir/i':
+        return gitdir_matches(pattern, config_file, git_dirs, ignore_case=True)
+    elif kind == 'onbranch':
+        branch = current_branch(git_dir)
+        if pattern.endswith('/'):
+            pattern += '**'
+        return branch is not None and wildmatch(pattern, branch)
+    return False
+
+
+def read_config(config_file, git_dir, depth=0):
+    """
+    Yield the variables of ``config_file`` and of the files it includes
+    with ``include.path`` or an ``includeIf`` that applies to ``git_dir``.
+    """
+    try:
+        with open(config_file, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return
+
+    for section, subsection, key, value in parse_config(text):
+        yield section, subsection, key, value
+
+        included = section == 'include' or (
+            section == 'includeif' and
+            git_dir is not None and
+            include_applies(subsection or '', config_file, git_dir))
+        # Git stops at the same depth
+        if included and key == 'path' and depth < 10:
+            path = os.path.expanduser(value)
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(config_file), path)
+            yield from read_config(path, git_dir, depth + 1)
+
+
+def config_files(git_dir):
+    """Return the configuration files of ``git_dir`` from the least specific."""
+    xdg_config = os.environ.get('XDG_CONFIG_HOME',
+                                os.path.join(os.path.expanduser('~'), '.config'))
+    files = [
+        os.path.join(xdg_config, 'git', 'config'),
+        os.path.expanduser('~/.gitconfig'),
+        os.path.join(common_dir(git_dir), 'config'),
+        os.path.join(git_dir, 'config.worktree'),
+    ]
+    return [f for f in files if os.path.isfile(f)]
+
+
+def rewrite_url(url, rewrites):
+    """Apply the longest matching ``url.<base>.insteadOf`` to ``url``."""
+    matches = [(prefix, base) for prefix, base in rewrites if url.startswith(prefix)]
+    if not matches:
+        return url
+    prefix, base = max(matches, key=lambda match: len(match[0]))
+    return base + url[len(prefix):]
+
+
+_remotes_cache = {}
+
+
+def read_remotes(git_dir):
+    """
+    Return a dictionary of the remote names of ``git_dir`` mapped to their
+    URLs, cached until its configuration files change.
+    """
+    files = config_files(git_dir)
+    key = (git_dir, tuple((f, os.stat(f).st_mtime_ns) for f in files))
+    if key in _remotes_cache:
+        return _remotes_cache[key]
+
+    remotes, rewrites = {}, []
+    for config_file in files:
+        for section, subsection, name, value in read_config(config_file, git_dir):
+            if section == 'remote' and name == 'url' and subsection not in remotes:
+                remotes[subsection] = value
+            elif section == 'url' and name == 'insteadof':
+                rewrites.append((value, subsection))
+
+    remotes = {name: rewrite_url(url, rewrites) for name, url in remotes.items()}
+    _remotes_cache[key] = remotes
+    return remotes
+
+
+# -- Remotes ------------------------------------------------------------------
 
 def get_remotes():
     """
@@ -12,47 +253,142 @@ def get_remotes():
 
     Otherwise return ``None``.
     """
-    tmp_file = tempfile.NamedTemporaryFile(mode='w+', delete=False)
+    git_dir = find_git_dir()
+    if git_dir is None:
+        return None
+
+    return {name: url for name, url in read_remotes(git_dir).items()
+            if is_github_url(url)}
+
+
+def parse_remote_url(remote_url):
+    """
+    Return the host, user and repository of a remote URL, which can be an
+    URL like ``https://github.com/user/repo`` or an scp-like SSH address like
+    ``git@github.com:user/repo.git``.
+    """
+    if '://' in remote_url:
+        url = urlparse(remote_url)
+        host, path = url.hostname, url.path
+    else:
+        address, _, path = remote_url.partition(':')
+        host = address.rpartition('@')[2]
+
+    path = path.strip('/')
+    if path.endswith('.git'):
+        path = path[:-len('.git')]
+    # Enterprise installations may serve the repositories under a prefix
+    user, repo = path.split('/')[-2:]
+    return host, user, repo
 
-    retcode = subprocess.call(['git', 'remote', '-v'], stdout=tmp_file.file)
 
-    # Store the output of the command and delete temporary file
-    tmp_file.file.seek(0)
-    raw_remotes = tmp_file.read()
-    os.remove(tmp_file.name)
+def is_github_url(remote_url):
+    try:
+        host, _, _ = parse_remote_url(remote_url)
+    except ValueError:
+        return False
+    return host is not None and ('github' in host or host in GITHUB_HOSTS)
 
-    # Get the GitHub remote strings
-    nonempty_remotes = [r for r in raw_remotes.split('\n') if 'github' in r]
 
-    # Process the raw remotes for returning a list of URLs
-    # Extract the url for each remote string
-    remotes = dict(remote_name_and_url(r) for r in nonempty_remotes)
+def extract_user_and_repo_from_remote(remote_url):
+    _, user, repo = parse_remote_url(remote_url)
+    return user, repo
 
-    return remotes if retcode == 0 else None
 
+# The additions and deletions of a file in a diff, ``None`` for binary files
+FileStat = namedtuple('FileStat', ['path', 'additions', 'deletions'])
 
-def remote_name_and_url(remotestring):
+
+class GitError(Exception):
+    """A git command failed, timed out or couldn't be run."""
+
+
+def git_environment():
     """
-    Given a remote string from the output of the ``git remote -v`` command,
-    return a tuple of the name and URL of the remote.
+    Return the environment of git commands, which make them fail instead of
+    asking for credentials or a passphrase on the terminal of the UI.
     """
-    name_url = remotestring.split(' ')[0]
-    return tuple(name_url.split('\t'))
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    env['GIT_SSH_COMMAND'] = '%s -o BatchMode=yes' % env.get('GIT_SSH_COMMAND', 'ssh')
+    return env
 
 
-def extract_user_and_repo_from_remote(remote_url):
-    # TODO: name slices
-    if remote_url.startswith('git://'):
-        # Git remote
-        user_repo = remote_url.split('/')[3:]
-        user, repo = user_repo[0], user_repo[1][:-4]
-    elif remote_url.startswith('http'):
-        # HTTP[S] remote
-        user_repo = remote_url.split('/')[3:]
-        user, repo = user_repo[0], user_repo[1][:-4]
-    else:
-        # SSH remote
-        user_repo = remote_url.split(':')[1][:-4]
-        user, repo = tuple(user_repo.split('/'))
+def git(*args):
+    """
+    Run a git command and return its output as bytes, raising ``GitError``
+    if it fails or takes longer than ``GIT_TIMEOUT`` seconds.
+    """
+    try:
+        return subprocess.check_output(('git',) + args,
+                                       stdin=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL,
+                                       env=git_environment(),
+                                       timeout=GIT_TIMEOUT)
+    except (subprocess.SubprocessError, OSError) as error:
+        raise GitError(error) from error
 
-    return user, repo
+
+class LocalRepository():
+    """
+    The clone shipit was started from, used to compute the diffs of pull
+    requests with git instead of downloading them.
+
+    The commits of a pull request are fetched from the ``remote`` the first
+    time its diff is asked for; the objects are reused for the next ones.
+    They are kept from being garbage collected by the ``refs/shipit/pull/*``
+    and ``refs/shipit/base/*`` refs written to the clone.
+    """
+    PULL_REF = 'refs/shipit/pull/%s'
+    BASE_REF = 'refs/shipit/base/%s'
+
+    def __init__(self, remote):
+        self.remote = remote
+
+    def has_commit(self, sha):
+        try:
+            git('cat-file', '-e', sha + '^{commit}')
+        except GitError:
+            return False
+        return True
+
+    def fetch_pull_request(self, pr):
+        """
+        Fetch the head and base commits of ``pr`` unless they are already in
+        the local object store.
+        """
+        refspecs = []
+        if not self.has_commit(pr.head.sha):
+            refspecs.append('+refs/pull/%s/head:%s' % (pr.number,
+                                                       self.PULL_REF % pr.number))
+        if not self.has_commit(pr.base.sha):
+            refspecs.append('+refs/heads/%s:%s' % (pr.base.ref,
+                                                   self.BASE_REF % pr.base.ref))
+        if refspecs:
+            git('fetch', '--quiet', '--no-tags', self.remote, *refspecs)
+
+    def diff(self, pr):
+        """Return the diff of ``pr`` like GitHub shows it, as bytes."""
+        self.fetch_pull_request(pr)
+        return git('diff', '--no-color', '--no-ext-diff', self._range(pr))
+
+    def numstat(self, pr):
+        """Return a ``FileStat`` for every file changed by ``pr``."""
+        self.fetch_pull_request(pr)
+        output = git('diff', '--numstat', self._range(pr))
+
+        stats = []
+        for line in output.decode('utf-8', 'replace').splitlines():
+            try:
+                additions, deletions, path = line.split('\t', 2)
+                if additions == '-':
+                    stats.append(FileStat(path, None, None))
+                else:
+                    stats.append(FileStat(path, int(additions), int(deletions)))
+            except ValueError as error:
+                raise GitError(error) from error
+        return stats
+
+    @staticmethod
+    def _range(pr):
+        # Changes since the merge base, the same GitHub shows
+        return '%s...%s' % (pr.base.sha, pr.head.sha)
@@ -0,0 +1,197 @@
+"""
+shipit.highlight
+~~~~~~~~~~~~~~~~
+
+Syntax highlighting of the code in diffs, if Pygments is installed.
+"""
+
+import threading
+from collections import OrderedDict
+
+from .executor import LOCAL
+from .instrument import timed
+
+try:
+    from pygments.token import Comment, Keyword, Name, Number, Operator, String
+except ImportError:
+    Comment = None
+
+# Display attributes of the Pygments token types, the most specific first
+if Comment is not None:
+    TOKEN_ATTRS = [
+        (Comment, "syntax_comment"),
+        (String, "syntax_string"),
+        (Number, "syntax_number"),
+        (Keyword, "syntax_keyword"),
+        (Name.Function, "syntax_name"),
+        (Name.Class, "syntax_name"),
+        (Operator.Word, "syntax_keyword"),
+    ]
+
+# Prefixes of the lines of a hunk and their attributes
+LINE_PREFIXES = {
+    "+": "green_text",
+    "-": "red_text",
+    " ": "code",
+}
+
+
+def token_attr(token):
+    for token_type, attr in TOKEN_ATTRS:
+        if token in token_type:
+            return attr
+    return "code"
+
+
+def file_path(lines):
+    """Return the path of the new file in the ``lines`` of a file diff."""
+    for line in lines:
+        if line.startswith("+++ "):
+            path = line[4:]
+            return path[2:] if path.startswith("b/") else path
+        elif line.startswith("diff --git "):
+            # Renamed or binary files have no ``+++`` line
+            path = line.rsplit(" ", 1)[-1]
+            return path[2:] if path.startswith("b/") else path
+    return None
+
+
+def file_blobs(lines):
+    """Return the ``index`` line identifying the blobs of a file diff."""
+    for line in lines:
+        if line.startswith("index "):
+            return line
+        elif line.startswith("@@"):
+            break
+    return None
+
+
+def lex_lines(lexer, lines):
+    """Return the markup of each of ``lines`` of code, lexed together."""
+    markups = [[] for line in lines]
+    if not lines:
+        return markups
+
+    current = 0
+    for token, text in lexer.get_tokens("\n".join(lines) + "\n"):
+        attr = token_attr(token)
+        *complete, text = text.split("\n")
+        for part in complete:
+            if part:
+                markups[current].append((attr, part))
+            current += 1
+        if text:
+            markups[current].append((attr, text))
+
+    return markups
+
+
+def highlight_lines(lines, lexer):
+    """
+    Return the markup of every line of a file diff, or ``None`` for the
+    lines that aren't code.
+
+    The old and the new versions of the code in the hunks are lexed apart,
+    so tokens spanning several lines are highlighted right.
+    """
+    old, new = [], []
+    in_hunk = False
+    for number, line in enumerate(lines):
+        if line.startswith("@@"):
+            in_hunk = True
+        elif not in_hunk:
+            continue
+        # Context lines are in both versions
+        if line[:1] in ("-", " "):
+            old.append(number)
+        if line[:1] in ("+", " "):
+            new.append(number)
+
+    markups = [None] * len(lines)
+    for numbers in (old, new):
+        code = lex_lines(lexer, [lines[number][1:] for number in numbers])
+        for number, markup in zip(numbers, code):
+            line = lines[number]
+            markups[number] = [(LINE_PREFIXES[line[0]], line[0])] + markup
+
+    return markups
+
+
+class Highlighter():
+    """
+    Highlight the files of ``DiffBuffer`` objects in the ``executor``.
+
+    The markups are cached by the blobs of the file and the lexer used, so
+    a file changed the same way in other pull requests or opened again
+    isn't lexed twice. Files with more than ``max_lines`` lines aren't
+    highlighted.
+    """
+    def __init__(self, executor, max_lines=20000, max_files=128):
+        self.executor = executor
+        self.max_lines = max_lines
+        self.max_files = max_files
+        self.hits = 0
+        self.misses = 0
+        self._markups = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return Comment is not None
+
+    def request(self, diff, index, callback, token=None):
+        """
+        Highlight file ``index`` of ``diff`` in a worker thread and call
+        ``callback`` on the UI thread with its first line number and the
+        markups of its lines.
+        """
+        if not self.enabled:
+            return
+
+        start, end = diff.file_lines(index)
+        if end - start > self.max_lines:
+            return
+
+        self.executor.submit(self.highlight,
+                             lambda future: self._on_highlighted(start, callback, future),
+                             diff, start, end,
+                             token=token,
+                             priority=LOCAL)
+
+    @timed("highlight.file")
+    def highlight(self, diff, start, end):
+        # Runs in a worker thread, the lexers take a while to import
+        from pygments.lexers import get_lexer_for_filename
+        from pygments.util import ClassNotFound
+
+        lines = [diff.line(number) for number in range(start, end)]
+
+        path = file_path(lines)
+        try:
+            lexer = get_lexer_for_filename(path, stripnl=False, ensurenl=False)
+        except (ClassNotFound, TypeError):
+            return None
+
+        blobs = file_blobs(lines)
+        key = (blobs, lexer.name) if blobs else (tuple(lines), lexer.name)
+        with self._lock:
+            markups = self._markups.get(key, None)
+            if markups is not None:
+                self.hits += 1
+                self._markups.move_to_end(key)
+                return markups
+            self.misses += 1
+
+        markups = highlight_lines(lines, lexer)
+
+        with self._lock:
+            self._markups[key] = markups
+            while len(self._markups) > self.max_files:
+                self._markups.popitem(last=False)
+
+        return markups
+
+    @staticmethod
+    def _on_highlighted(start, callback, future):
+        if future.exception() is None and future.result() is not None:
+            callback(start, future.result())
@@ -0,0 +1,49 @@
+"""
+shipit.http
+~~~~~~~~~~~
+
+Configuration of the HTTP session shared by every request to GitHub.
+"""
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import WORKERS, HTTP_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF
+
+# Temporary errors of the GitHub API worth retrying
+RETRY_STATUSES = (502, 503, 504)
+
+
+class TimeoutAdapter(HTTPAdapter):
+    """An ``HTTPAdapter`` with a ``timeout`` for requests that don't set one."""
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout', None) is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def configure_session(session):
+    """
+    Make ``session`` keep a connection alive for each of the executor's
+    workers, ask for compressed responses and retry idempotent requests
+    that failed temporarily.
+    """
+    retries = Retry(total=HTTP_RETRIES,
+                    backoff_factor=HTTP_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    raise_on_status=False)
+    # The workers plus the UI thread
+    adapter = TimeoutAdapter(HTTP_TIMEOUT,
+                             pool_connections=2,
+                             pool_maxsize=WORKERS + 1,
+                             max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    session.headers['Connection'] = 'keep-alive'
+    return session
@@ -0,0 +1,184 @@
+"""
+shipit.instrument
+~~~~~~~~~~~~~~~~~
+
+Opt-in timing of fetches, widget building and redraws, and a log of the
+requests made to GitHub, summarized when shipit exits. Also the numbers
+shown live in the HUD.
+
+Nothing is measured until ``enable`` is called, the timed functions only
+check a flag otherwise.
+"""
+
+import sys
+import time
+import resource
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+# Upper bounds in milliseconds of the buckets of the histograms
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Width of the longest bar of a histogram
+BAR_WIDTH = 40
+
+ENABLED = False
+
+# The durations in seconds of every span, by name
+SPANS = OrderedDict()
+
+# Every request made: (method, url, status, bytes, seconds)
+REQUESTS = []
+
+_lock = threading.Lock()
+_request_log = None
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def record(name, seconds):
+    """Record that the span ``name`` took ``seconds``."""
+    if not ENABLED:
+        return
+    with _lock:
+        SPANS.setdefault(name, []).append(seconds)
+
+
+def timed(name):
+    """Decorate a function to record every call to it as the span ``name``."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def trace_requests(session, path=None):
+    """
+    Record the requests made with the ``requests`` ``session``, writing a
+    line for each to the file in ``path`` if given.
+    """
+    global _request_log
+    if path is not None:
+        _request_log = open(path, 'w', buffering=1)
+    session.hooks['response'].append(on_response)
+
+
+def on_response(response, *args, **kwargs):
+    request = response.request
+    size = len(response.content or b'')
+    seconds = response.elapsed.total_seconds()
+    with _lock:
+        REQUESTS.append((request.method, request.url, response.status_code,
+                         size, seconds))
+        if _request_log is not None:
+            _request_log.write("%s %s %s %s %.1fms %s\n" % (
+                time.strftime('%H:%M:%S'),
+                request.method,
+                response.status_code,
+                size,
+                seconds * 1000,
+                request.url))
+    record('http.%s' % request.method, seconds)
+    return response
+
+
+def histogram(durations):
+    """Return the lines of a histogram of the ``durations`` in seconds."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for seconds in durations:
+        milliseconds = seconds * 1000
+        index = next((i for i, bound in enumerate(BUCKETS) if milliseconds < bound),
+                     len(BUCKETS))
+        counts[index] += 1
+
+    # Leave out the empty buckets at both ends
+    used = [i for i, count in enumerate(counts) if count]
+    if not used:
+        return []
+
+    most = max(counts)
+    lines = []
+    for index in range(used[0], used[-1] + 1):
+        if index < len(BUCKETS):
+            label = "< %sms" % BUCKETS[index]
+        else:
+            label = ">= %sms" % BUCKETS[-1]
+        bar = '#' * max(round(counts[index] * BAR_WIDTH / most), 1 if counts[index] else 0)
+        lines.append("    %10s %6s %s" % (label, counts[index], bar))
+    return lines
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summary():
+    """Return the text of the summary of the spans and requests recorded."""
+    with _lock:
+        spans = [(name, sorted(durations)) for name, durations in SPANS.items()]
+        requests = list(REQUESTS)
+
+    lines = []
+    for name, durations in spans:
+        lines.append("%s: %s calls, total %.3fs, mean %.1fms, p50 %.1fms, "
+                     "p95 %.1fms, max %.1fms" % (
+                         name,
+                         len(durations),
+                         sum(durations),
+                         sum(durations) / len(durations) * 1000,
+                         percentile(durations, 0.5) * 1000,
+                         percentile(durations, 0.95) * 1000,
+                         durations[-1] * 1000))
+        lines.extend(histogram(durations))
+
+    if requests:
+        statuses = OrderedDict()
+        for _, _, status, _, _ in requests:
+            statuses[status] = statuses.get(status, 0) + 1
+        lines.append("requests: %s, %.1f KiB, statuses %s" % (
+            len(requests),
+            sum(size for _, _, _, size, _ in requests) / 1024,
+            ", ".join("%s: %s" % item for item in statuses.items())))
+
+    return "\n".join(lines)
+
+
+def rss():
+    """Return the resident memory of the process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        pass
+    # Not Linux, the peak is all there is; in kilobytes except on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def hit_ratio(cache):
+    """Describe the ratio of ``hits`` of a ``cache`` to its lookups."""
+    lookups = cache.hits + cache.misses
+    if not lookups:
+        return "-"
+    return "%d%% of %s" % (cache.hits * 100 / lookups, lookups)
+
+
+def close():
+    global _request_log
+    with _lock:
+        if _request_log is not None:
+            _request_log.close()
+            _request_log = None
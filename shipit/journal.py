@@ -0,0 +1,311 @@
+"""
+shipit.journal
+~~~~~~~~~~~~~~
+
+Changes made to issues, recorded durably and sent to GitHub in order once it
+can be reached.
+
+Until GitHub confirms them, the changes are shown on the issues they were
+made to. A change is discarded if the issue was changed on GitHub in a way
+the change would silently overwrite.
+"""
+
+import time
+from copy import copy
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from github3.models import GitHubError
+from requests.exceptions import (
+    RequestException, ConnectionError, ConnectTimeout
+)
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .http import RETRY_STATUSES
+from .instrument import timed
+from .models import is_pull_request, iter_comments, iter_issues
+
+CREATE = 'create'
+CLOSE = 'close'
+REOPEN = 'reopen'
+EDIT = 'edit'
+COMMENT = 'comment'
+
+# Changes that are made again when they are sent twice
+NOT_IDEMPOTENT = (CREATE, COMMENT)
+
+# A change of the issue ``number`` made when it was last updated at ``base``
+Mutation = namedtuple('Mutation', ['id', 'action', 'number', 'base', 'data'])
+
+# Format of the time a change was made, the one GitHub uses
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# How far the clock of this computer may be ahead of GitHub's when looking
+# for a change that may have been made already
+CLOCK_SKEW = timedelta(hours=1)
+
+# What became of a change sent to GitHub
+SENT = 'sent'
+CONFLICT = 'conflict'
+FAILED = 'failed'
+OFFLINE = 'offline'
+
+
+def apply_locally(mutation, issue):
+    """Show ``mutation`` on ``issue`` before GitHub confirms it."""
+    data = mutation.data
+    if mutation.action == CLOSE:
+        issue.state = 'closed'
+    elif mutation.action == REOPEN:
+        issue.state = 'open'
+    elif mutation.action == EDIT:
+        issue.title = data['title']
+        issue.body = issue.body_text = data['body']
+
+
+def conflicts(mutation, issue):
+    """
+    Return whether ``issue``, as it's on GitHub, was changed since
+    ``mutation`` was made in a way the mutation would overwrite.
+    """
+    if str(issue.updated_at) == mutation.base:
+        return False
+
+    data = mutation.data
+    if mutation.action == EDIT:
+        return (issue.title, issue.body) != (data['old_title'], data['old_body'])
+    elif mutation.action in (CLOSE, REOPEN):
+        return issue.state != data['old_state']
+    # Comments don't overwrite anything
+    return False
+
+
+def is_transient(error):
+    """
+    Return whether sending a change failed for a reason that may go away,
+    like no connection or GitHub being unavailable.
+    """
+    if isinstance(error, RequestException):
+        return True
+    return isinstance(error, GitHubError) and error.code in RETRY_STATUSES
+
+
+def never_sent(error):
+    """
+    Return whether ``error`` happened before the request reached GitHub,
+    because a connection couldn't be made.
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    elif not isinstance(error, ConnectionError) or not error.args:
+        return False
+
+    reason = error.args[0]
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+def current_login(repo):
+    """Return the login of the user changing the issues of ``repo``."""
+    url = repo._build_url('user')
+    return repo._json(repo._get(url), 200)['login']
+
+
+def find_sent(repo, mutation, issue=None):
+    """
+    Return the issue created by ``mutation``, or the comment it made on
+    ``issue``, if it reached GitHub before the answer was lost; ``None``
+    otherwise.
+
+    It's looked for among the ones with the same text made by the same user
+    since the change was recorded.
+    """
+    data = mutation.data
+    since = None
+    if 'made' in data:
+        made = datetime.strptime(data['made'], TIME_FORMAT)
+        since = made.replace(tzinfo=timezone.utc) - CLOCK_SKEW
+    login = current_login(repo)
+
+    if mutation.action == CREATE:
+        params = {'state': 'all', 'creator': login}
+        if since is not None:
+            params['since'] = since.strftime(TIME_FORMAT)
+        for created in iter_issues(repo, params):
+            if is_pull_request(created):
+                continue
+            if (created.title, created.body) == (data['title'], data['body']):
+                return created
+        return None
+
+    for comment in iter_comments(issue):
+        if since is not None and comment.created_at < since:
+            continue
+        if str(comment.user) == login and comment.body == data['body']:
+            return comment
+    return None
+
+
+@timed("journal.send")
+def send(repo, mutation, uncertain=False):
+    """
+    Send ``mutation`` to GitHub and return what became of it and the issue
+    as it's now on GitHub.
+
+    When it's ``uncertain`` whether a change that isn't idempotent was sent
+    already, it isn't sent again if what it makes is found on GitHub.
+    """
+    data = mutation.data
+    if mutation.action == CREATE:
+        issue = uncertain and find_sent(repo, mutation) or None
+        if issue is None:
+            issue = repo.create_issue(title=data['title'], body=data['body'])
+        return (SENT if issue else FAILED), issue
+
+    issue = repo.issue(mutation.number)
+    if issue is None:
+        return FAILED, None
+    elif conflicts(mutation, issue):
+        return CONFLICT, issue
+
+    if mutation.action == CLOSE:
+        done = issue.state == 'closed' or issue.close()
+    elif mutation.action == REOPEN:
+        done = issue.state == 'open' or issue.reopen()
+    elif mutation.action == EDIT:
+        done = issue.edit(title=data['title'], body=data['body'])
+    elif mutation.action == COMMENT:
+        done = ((uncertain and find_sent(repo, mutation, issue) is not None) or
+                issue.create_comment(data['body']) is not None)
+        # The comment updated the issue
+        issue = repo.issue(mutation.number) or issue
+
+    return (SENT if done else FAILED), issue
+
+
+class Journal():
+    """
+    The changes made to the issues of ``repo``, stored in ``cache`` and sent
+    one at a time by the ``executor`` in the order they were made.
+
+    When GitHub can't be reached or is unavailable, sending is retried
+    every ``retry`` seconds with ``schedule``. A creation or comment that
+    may have reached GitHub before the error, or that was left by a previous
+    session, is looked for on GitHub before it's sent again.
+
+    ``on_sent`` callbacks are called on the UI thread with every
+    ``Mutation`` sent, what became of it and the issue as it's on GitHub,
+    which is ``None`` when the outcome is ``OFFLINE`` or GitHub rejected
+    the change.
+    """
+    def __init__(self, repo, cache, executor, schedule, retry=30):
+        self.repo = repo
+        self.cache = cache
+        self.executor = executor
+        self.schedule = schedule
+        self.retry = retry
+        self.pending = [Mutation(*row) for row in cache.mutations()]
+        # The previous session may have sent them without hearing back
+        self._uncertain = {m.id for m in self.pending
+                           if m.action in NOT_IDEMPOTENT}
+        self.offline = False
+        self._sending = False
+        self._retry_scheduled = False
+        self._callbacks = []
+
+    def on_sent(self, callback):
+        self._callbacks.append(callback)
+
+    def record(self, action, issue=None, **data):
+        """
+        Record a change to ``issue``, or the creation of one, returning a copy
+        of the issue with the change shown on it to show right away.
+        """
+        number = issue.number if issue is not None else None
+        base = str(issue.updated_at) if issue is not None else None
+        data['made'] = time.strftime(TIME_FORMAT, time.gmtime())
+        id = self.cache.add_mutation(action, number, base, data)
+
+        mutation = Mutation(id, action, number, base, data)
+        self.pending.append(mutation)
+        if issue is not None:
+            issue = copy(issue)
+            apply_locally(mutation, issue)
+
+        # When offline it's sent with the next retry
+        if not self.offline:
+            self.replay()
+        return issue
+
+    def pending_for(self, issue):
+        return [m for m in self.pending if m.number == issue.number]
+
+    def overlay(self, issues):
+        """
+        Return ``issues``, as they came from GitHub, with the pending changes
+        shown on copies of them. The issues given aren't changed: the thread
+        that fetched them may still be storing them in the cache.
+        """
+        if not self.pending:
+            return list(issues)
+        return [self._overlay_issue(issue) for issue in issues]
+
+    def _overlay_issue(self, issue):
+        mutations = self.pending_for(issue)
+        if not mutations:
+            return issue
+
+        issue = copy(issue)
+        for mutation in mutations:
+            apply_locally(mutation, issue)
+        return issue
+
+    def replay(self):
+        """Send the pending changes, unless they are being sent."""
+        if self._sending or not self.pending:
+            return
+
+        self._sending = True
+        mutation = self.pending[0]
+        self.executor.submit(send,
+                             lambda future: self._on_sent(mutation, future),
+                             self.repo, mutation,
+                             mutation.id in self._uncertain)
+
+    def _on_sent(self, mutation, future):
+        self._sending = False
+
+        error = future.exception()
+        if is_transient(error):
+            # Try again later, in order, without making it twice if it got
+            # to GitHub
+            if mutation.action in NOT_IDEMPOTENT and not never_sent(error):
+                self._uncertain.add(mutation.id)
+            self.offline = True
+            if not self._retry_scheduled:
+                self._retry_scheduled = True
+                self.schedule(self.retry, self._retry)
+            self._notify(mutation, OFFLINE, None)
+            return
+
+        self.offline = False
+        if error is None:
+            outcome, issue = future.result()
+        else:
+            # Rejected by GitHub, e.g. the issue was deleted
+            outcome, issue = FAILED, None
+
+        self.cache.remove_mutation(mutation.id)
+        self.pending.remove(mutation)
+        self._uncertain.discard(mutation.id)
+        self._notify(mutation, outcome, issue)
+        self.replay()
+
+    def _retry(self):
+        self._retry_scheduled = False
+        self.replay()
+
+    def _notify(self, mutation, outcome, issue):
+        for callback in self._callbacks:
+            callback(mutation, outcome, issue)
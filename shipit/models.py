@@ -1,4 +1,5 @@
 from github3.issues import Issue
+from github3.issues.comment import IssueComment
 from github3.pulls import PullRequest
 
 
@@ -18,3 +19,29 @@ def is_closed(item):
 
 def is_pull_request(item):
     return isinstance(item, PullRequest)
+
+
+def item_kind(item):
+    return 'pull' if is_pull_request(item) else 'issue'
+
+
+def iter_comments(item, etag=None):
+    """
+    Iterate over the comments of the issue or pull request ``item``, sending
+    ``etag`` to be told if they didn't change.
+    """
+    if is_pull_request(item):
+        return item.iter_comments(etag=etag)
+    # github3 doesn't take an ETag for the comments of an issue
+    url = item._build_url('comments', base_url=item._api)
+    return item._iter(-1, url, IssueComment, etag=etag)
+
+
+def iter_issues(repo, params, etag=None):
+    """
+    Iterate over the issues of ``repo`` matching the query ``params``,
+    sending ``etag`` to be told if they didn't change.
+    """
+    # github3 doesn't take the creator of the issues
+    url = repo._build_url('issues', base_url=repo._api)
+    return repo._iter(-1, url, Issue, params, etag)
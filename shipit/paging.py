@@ -0,0 +1,63 @@
+"""
+shipit.paging
+~~~~~~~~~~~~~
+
+Split the results of GitHub's paginated listings into pages as they arrive.
+"""
+
+from collections import namedtuple
+from urllib.parse import urlparse, parse_qs
+
+# The objects in a page, its number and the estimated number of pages
+Page = namedtuple('Page', ['items', 'number', 'total'])
+
+# Page size github3 asks for when iterating over every result
+PER_PAGE = 100
+
+OK = 200
+
+
+def last_page_number(response, default):
+    """
+    Return the number of the last page of the listing ``response`` is part
+    of, using its ``Link`` header.
+    """
+    last = response.links.get('last', {}).get('url', None) if response else None
+    if last is None:
+        return default
+
+    try:
+        return int(parse_qs(urlparse(last).query)['page'][0])
+    except (KeyError, ValueError):
+        return default
+
+
+def iter_pages(iterator):
+    """
+    Consume a ``GitHubIterator`` yielding a ``Page`` as soon as every one
+    of them is complete.
+
+    Nothing is yielded when the server answers a conditional request with
+    "Not Modified"; a single empty page is yielded for an empty listing.
+    """
+    items, number, response = [], 0, None
+
+    for item in iterator:
+        if iterator.last_response is not response:
+            response = iterator.last_response
+            if items:
+                number += 1
+                yield Page(items, number, last_page_number(response, number + 1))
+                items = []
+
+        items.append(item)
+
+        # Don't wait for the next page to know this one is complete
+        if len(items) == PER_PAGE:
+            number += 1
+            yield Page(items, number, last_page_number(response, number))
+            items = []
+
+    if items or (number == 0 and iterator.last_status == OK):
+        number += 1
+        yield Page(items, number, number)
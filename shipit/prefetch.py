@@ -0,0 +1,115 @@
+"""
+shipit.prefetch
+~~~~~~~~~~~~~~~
+
+Warm the detail views of the items around the focused one in the list.
+"""
+
+from collections import OrderedDict, deque
+
+from .executor import Token, BACKGROUND
+from .models import is_pull_request
+from .store import item_key
+
+
+class Prefetcher():
+    """
+    Fetch the comments, and the summary of pull requests, of the focused
+    item and its ``radius`` neighbours on each side, so their detail views
+    are served from memory.
+
+    At most ``max_requests`` comment threads are fetched at once by the
+    ``executor`` with ``fetch_comments``; focusing another item cancels the
+    prefetching for the previous one. The comments of the last
+    ``max_items`` items are kept.
+    """
+    def __init__(self, executor, fetch_comments, pr_summaries,
+                 radius=2, max_requests=2, max_items=256):
+        self.executor = executor
+        self.fetch_comments = fetch_comments
+        self.pr_summaries = pr_summaries
+        self.radius = radius
+        self.max_requests = max_requests
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._comments = OrderedDict()
+        self._token = Token()
+        self._queued = deque()
+        self._in_flight = 0
+
+    def get_comments(self, item):
+        """
+        Return the comments of ``item`` if they were fetched since it was
+        last updated, otherwise ``None``.
+        """
+        key = self._key(item)
+        comments = self._comments.get(key, None)
+        if comments is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._comments.move_to_end(key)
+        return comments
+
+    def set_comments(self, item, comments):
+        key = self._key(item)
+        self._comments[key] = comments
+        self._comments.move_to_end(key)
+        while len(self._comments) > self.max_items:
+            self._comments.popitem(last=False)
+
+    def focus(self, items, position):
+        """Prefetch the item in ``position`` of ``items`` and its neighbours."""
+        self._token.cancel()
+        self._token = Token()
+        self._queued.clear()
+
+        if not items:
+            return
+
+        # The focused item first, then the closest ones
+        positions = [position]
+        for distance in range(1, self.radius + 1):
+            positions.extend([position + distance, position - distance])
+
+        for position in positions:
+            if not 0 <= position < len(items):
+                continue
+            item = items[position]
+            if is_pull_request(item):
+                self.pr_summaries.request(item)
+            if self.get_comments(item) is None:
+                self._queued.append(item)
+
+        self._pump()
+
+    def _pump(self):
+        token = self._token
+        while self._queued and self._in_flight < self.max_requests:
+            item = self._queued.popleft()
+            self._in_flight += 1
+            # Not cancelled with the token: the callback has to be called to
+            # count the fetch as finished
+            self.executor.submit(self._fetch,
+                                 lambda future, item=item: self._on_fetched(item, future),
+                                 item, token,
+                                 priority=BACKGROUND)
+
+    def _fetch(self, item, token):
+        # Dropped before starting when another item was focused
+        if token.cancelled:
+            return None
+        return self.fetch_comments(item)
+
+    def _on_fetched(self, item, future):
+        self._in_flight -= 1
+        self._pump()
+
+        if future.exception() is None and future.result() is not None:
+            self.set_comments(item, future.result())
+
+    @staticmethod
+    def _key(item):
+        # New comments change the update time of the item
+        return item_key(item), item.updated_at
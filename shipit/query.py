@@ -0,0 +1,72 @@
+"""
+shipit.query
+~~~~~~~~~~~~
+
+The filters and the sort order of the issues and pull requests shown.
+
+The filters of issues are sent to GitHub as the parameters of the listing,
+so only the issues shown are downloaded. GitHub doesn't filter pull requests
+by these, the stored ones are filtered instead. The items are sorted as they
+are stored.
+"""
+
+from collections import namedtuple
+from urllib.parse import urlencode
+
+# The orders the issues can be sorted in, descending; the first is the default
+SORTS = ('created', 'updated', 'comments')
+
+
+class Query(namedtuple('Query', ['labels', 'assignee', 'milestone', 'creator', 'sort'])):
+    """
+    The items with every one of ``labels``, assigned to the ``assignee``
+    login, in the milestone with the ``milestone`` number and opened by the
+    ``creator`` login, sorted by ``sort``.
+
+    A filter that is ``None`` or has no labels matches every item.
+    """
+    __slots__ = ()
+
+    def __new__(cls, labels=(), assignee=None, milestone=None, creator=None,
+                sort=SORTS[0]):
+        return super().__new__(cls, tuple(sorted(labels)), assignee, milestone,
+                               creator, sort)
+
+    @property
+    def filtered(self):
+        """Whether it matches only some of the items."""
+        return bool(self.labels) or any(value is not None for value in
+                                        (self.assignee, self.milestone, self.creator))
+
+    def criteria(self, kind):
+        """
+        Return the ``ItemStore`` criteria of the items of ``kind`` matching
+        it. Pull requests don't have labels, an assignee nor a milestone.
+        """
+        criteria = {}
+        if kind == 'issue':
+            if self.labels:
+                criteria['label'] = self.labels
+            if self.assignee is not None:
+                criteria['assignee'] = self.assignee
+            if self.milestone is not None:
+                criteria['milestone'] = self.milestone
+        if self.creator is not None:
+            criteria['creator'] = self.creator
+        return criteria
+
+    def params(self, state):
+        """Return the parameters of the listing of the issues in ``state``."""
+        # The same listing for every order, the newest changes first
+        params = {'state': state, 'sort': 'updated', 'direction': 'desc'}
+        if self.labels:
+            params['labels'] = ','.join(self.labels)
+        for name in ('assignee', 'milestone', 'creator'):
+            value = getattr(self, name)
+            if value is not None:
+                params[name] = value
+        return params
+
+    def key(self, state):
+        """Return the cache key of the listing of the issues in ``state``."""
+        return 'issues/%s?%s' % (state, urlencode(sorted(self.params(state).items())))
@@ -0,0 +1,76 @@
+"""
+shipit.ratelimit
+~~~~~~~~~~~~~~~~
+
+Keep track of the GitHub API rate limit from the headers of the responses.
+"""
+
+import time
+import threading
+
+from .executor import BACKGROUND
+
+
+class RateLimit():
+    """
+    The remaining requests of the rate limit and when it's reset, updated
+    with every response of the sessions it ``watch``es.
+
+    When fewer than ``reserve`` requests remain, background work is held
+    back until the limit is reset so the user can keep working.
+    """
+    def __init__(self, reserve=100):
+        self.reserve = reserve
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def watch(self, session):
+        """Update the rate limit with the responses of a ``requests`` session."""
+        session.hooks['response'].append(self.on_response)
+
+    def on_change(self, callback):
+        """
+        Call ``callback`` when the remaining requests change; it's called on
+        the thread that made the request.
+        """
+        self._callbacks.append(callback)
+
+    def on_response(self, response, *args, **kwargs):
+        headers = response.headers
+        # Searches have a limit of their own
+        if headers.get('X-RateLimit-Resource', 'core') != 'core':
+            return response
+
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = int(headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError):
+            return response
+
+        with self._lock:
+            changed = remaining != self.remaining
+            self.limit, self.remaining, self.reset = limit, remaining, reset
+
+        if changed:
+            for callback in self._callbacks:
+                callback(self)
+
+        return response
+
+    def delay(self, priority):
+        """Return the seconds work of ``priority`` has to wait to start."""
+        with self._lock:
+            if priority < BACKGROUND or self.remaining is None:
+                return 0
+            if self.remaining >= self.reserve:
+                return 0
+            return max(self.reset - time.time(), 0)
+
+    def __str__(self):
+        if self.remaining is None:
+            return ""
+        return "API %s/%s" % (self.remaining, self.limit)
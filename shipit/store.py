@@ -0,0 +1,195 @@
+"""
+shipit.store
+~~~~~~~~~~~~
+
+An in-memory store of issues and pull requests, indexed by id and by the
+attributes they are filtered by.
+"""
+
+from collections import defaultdict, namedtuple
+
+from .models import item_kind
+
+
+def item_key(item):
+    """Return the key identifying ``item`` in a store."""
+    return item_kind(item), item.id
+
+
+def item_labels(item):
+    return [label.name for label in getattr(item, 'labels', None) or []]
+
+
+def item_assignee(item):
+    assignee = getattr(item, 'assignee', None)
+    return [str(assignee)] if assignee else []
+
+
+def item_milestone(item):
+    milestone = getattr(item, 'milestone', None)
+    return [milestone.number] if milestone else []
+
+
+def item_creator(item):
+    user = getattr(item, 'user', None)
+    return [str(user)] if user else []
+
+
+# The attributes an item can be looked up by. Each of them maps to a function
+# that returns the list of values an item has for that attribute.
+INDEXES = {
+    'kind': lambda item: [item_kind(item)],
+    'state': lambda item: [item.state],
+    'label': item_labels,
+    'assignee': item_assignee,
+    'milestone': item_milestone,
+    'creator': item_creator,
+}
+
+
+# The key items are sorted by, descending, for each sort order of ``Query``
+ORDERS = {
+    'created': lambda item: item.number,
+    'updated': lambda item: (item.updated_at, item.number),
+    # Pull requests don't have the number of comments
+    'comments': lambda item: (getattr(item, 'comments', None) or 0, item.number),
+}
+
+
+# The changes between two lists of items, ``items`` being the new list
+Delta = namedtuple('Delta', ['items', 'inserted', 'removed', 'updated'])
+
+
+def snapshot(items):
+    """
+    Return a dictionary mapping the key of every item to the item and its
+    ``updated_at``, for comparing it later with ``diff``.
+    """
+    return dict((item_key(i), (i, i.updated_at)) for i in items)
+
+
+def diff(before, items):
+    """
+    Return the ``Delta`` between the ``before`` snapshot and ``items``, or
+    ``None`` if nothing changed.
+    """
+    inserted, updated = [], []
+    keys = set()
+    for item in items:
+        key = item_key(item)
+        keys.add(key)
+        if key not in before:
+            inserted.append(item)
+        elif before[key] != (item, item.updated_at):
+            updated.append(item)
+
+    removed = [i for key, (i, _) in before.items() if key not in keys]
+
+    if inserted or removed or updated:
+        return Delta(items, inserted, removed, updated)
+
+
+class ItemStore():
+    """
+    Issues and pull requests keyed by kind and id.
+
+    Every item is indexed by the attributes in ``INDEXES`` so selecting the
+    items with some attributes doesn't need to look at the rest.
+    """
+    def __init__(self, items=()):
+        self._items = {}
+        self._indexes = dict((name, defaultdict(set)) for name in INDEXES)
+        # The values each item was indexed with, items are mutable
+        self._indexed = {}
+        for item in items:
+            self.upsert(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item_key(item) in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def get(self, kind, id):
+        return self._items.get((kind, id), None)
+
+    def upsert(self, item):
+        """
+        Add ``item`` to the store, replacing the stored version of it. Call
+        it again after modifying a stored item to update the indexes.
+
+        Return whether the store changed.
+        """
+        key = item_key(item)
+        indexed = dict((name, values(item)) for name, values in INDEXES.items())
+        if self._items.get(key, None) is item and self._indexed[key] == indexed:
+            return False
+
+        self._unindex(key)
+        self._items[key] = item
+        self._indexed[key] = indexed
+        for name, values in indexed.items():
+            for value in values:
+                self._indexes[name][value].add(key)
+        return True
+
+    def remove(self, item):
+        key = item_key(item)
+        if self._items.pop(key, None) is not None:
+            self._unindex(key)
+
+    def merge(self, fetched):
+        """
+        Upsert the ``fetched`` items. The stored items that weren't updated
+        since are kept, so refetching doesn't replace every object.
+        """
+        for item in fetched:
+            stored = self._items.get(item_key(item), None)
+            if stored is None or stored.updated_at != item.updated_at:
+                self.upsert(item)
+
+    def retain(self, keys, **criteria):
+        """
+        Remove the items matching ``criteria`` whose key isn't in ``keys``.
+
+        Return whether the store changed.
+        """
+        stale = self._keys(**criteria) - set(keys)
+        for key in stale:
+            self._items.pop(key)
+            self._unindex(key)
+        return bool(stale)
+
+    def select(self, order='created', **criteria):
+        """
+        Return the items matching every ``attribute=value`` in ``criteria``
+        sorted by the ``order`` in ``ORDERS``, newest first. A tuple of values
+        matches the items with all of them.
+        """
+        keys = self._keys(**criteria)
+        items = [self._items[key] for key in keys]
+        items.sort(key=ORDERS[order], reverse=True)
+        return items
+
+    def _keys(self, **criteria):
+        matches = []
+        for name, value in criteria.items():
+            values = value if isinstance(value, tuple) else (value,)
+            matches.extend(self._indexes[name].get(v, set()) for v in values)
+        if not matches:
+            return set(self._items)
+
+        # Start from the smallest index to intersect less
+        matches.sort(key=len)
+        return set(matches[0]).intersection(*matches[1:])
+
+    def _unindex(self, key):
+        for name, values in self._indexed.pop(key, {}).items():
+            index = self._indexes[name]
+            for value in values:
+                index[value].discard(key)
+                if not index[value]:
+                    del index[value]
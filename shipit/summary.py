@@ -0,0 +1,101 @@
+"""
+shipit.summary
+~~~~~~~~~~~~~~
+
+Counts of comments, commits and changed lines of pull requests.
+
+The pull request listing doesn't include them, but a single request for the
+pull request does; they are fetched once and shared by the list rows and the
+detail view.
+"""
+
+from collections import namedtuple, deque
+
+from .executor import BACKGROUND
+from .instrument import timed
+
+PRSummary = namedtuple('PRSummary', ['comments',
+                                     'commits',
+                                     'additions',
+                                     'deletions',
+                                     'changed_files'])
+
+
+def summary_key(pr):
+    # A new push changes the head, a new comment the update time
+    return pr.number, pr.head.sha, pr.updated_at
+
+
+class PRSummaries():
+    """
+    Fetch and memoize the ``PRSummary`` of pull requests.
+
+    At most ``max_requests`` summaries are fetched concurrently by the
+    ``executor``; ``on_summary`` callbacks are called on the UI thread with
+    the pull request whose summary arrived.
+    """
+    def __init__(self, repo, executor, max_requests=4):
+        self.repo = repo
+        self.executor = executor
+        self.max_requests = max_requests
+        self.hits = 0
+        self.misses = 0
+        self._summaries = {}
+        self._queued = deque()
+        self._requested = set()
+        self._in_flight = 0
+        self._callbacks = []
+
+    def on_summary(self, callback):
+        self._callbacks.append(callback)
+
+    def get(self, pr):
+        """Return the summary of ``pr`` or ``None`` if it isn't known yet."""
+        summary = self._summaries.get(summary_key(pr), None)
+        if summary is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return summary
+
+    def request(self, pr):
+        """Fetch the summary of ``pr`` unless it's known or requested."""
+        key = summary_key(pr)
+        if key in self._summaries or key in self._requested:
+            return
+
+        self._requested.add(key)
+        self._queued.append(pr)
+        self._pump()
+
+    def _pump(self):
+        while self._queued and self._in_flight < self.max_requests:
+            pr = self._queued.popleft()
+            self._in_flight += 1
+            self.executor.submit(self.fetch_summary,
+                                 lambda future, pr=pr: self._on_fetched(pr, future),
+                                 pr,
+                                 priority=BACKGROUND)
+
+    @timed("fetch.pr_summary")
+    def fetch_summary(self, pr):
+        # Runs in a worker thread
+        data = self.repo.pull_request(pr.number).to_json()
+        return PRSummary(comments=data.get('review_comments', 0),
+                         commits=data.get('commits', 0),
+                         additions=data.get('additions', 0),
+                         deletions=data.get('deletions', 0),
+                         changed_files=data.get('changed_files', 0))
+
+    def _on_fetched(self, pr, future):
+        key = summary_key(pr)
+        self._in_flight -= 1
+        self._requested.discard(key)
+        self._pump()
+
+        if future.exception() is not None:
+            return
+
+        self._summaries[key] = future.result()
+        for callback in self._callbacks:
+            callback(pr)
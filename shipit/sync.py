@@ -0,0 +1,120 @@
+"""
+shipit.sync
+~~~~~~~~~~~
+
+Incremental synchronization of the issues of a repository.
+"""
+
+from functools import partial
+
+from .cache import conditional_pages
+from .models import iter_issues
+
+# Format of the ``since`` parameter of the GitHub API
+SINCE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+STATES = ('open', 'closed')
+
+
+def newest(items):
+    """Return the ``updated_at`` of the most recently updated of ``items``."""
+    return max(i.updated_at for i in items).strftime(SINCE_FORMAT)
+
+
+class IssueSync():
+    """
+    Keep the cached issues of a repository up to date.
+
+    The newest ``updated_at`` seen for each state is remembered, so after the
+    first complete download only the issues updated since then are
+    requested.
+    """
+    def __init__(self, repo, cache):
+        self.repo = repo
+        self.cache = cache
+
+    def is_complete(self, state):
+        """
+        Return whether the next sync of ``state`` fetches all the issues in
+        it, instead of the ones updated since the last sync.
+        """
+        return self.cache.watermark(self._key(state)) is None
+
+    def sync(self, state):
+        """
+        Fetch the issues in ``state`` that changed since the last sync,
+        yielding the pages of issues as they arrive. Nothing is yielded if
+        nothing changed.
+
+        Once every page was consumed, the fetched issues are stored in the
+        cache.
+
+        Since an issue that was closed or reopened no longer shows up when
+        asking for the issues in its former state, the issues in the other
+        state updated since the last sync are fetched too.
+        """
+        since = self.cache.watermark(self._key(state))
+        complete = since is None
+
+        if complete:
+            queries = [self._pages(state)]
+        else:
+            queries = [self._pages(s, since) for s in STATES]
+
+        issues = []
+        for query in queries:
+            for page in query:
+                issues.extend(page.items)
+                yield page._replace(items=self._only_issues(page.items))
+
+        only_issues = self._only_issues(issues)
+        if complete:
+            self.cache.replace_items('issue', state, only_issues)
+        else:
+            self.cache.put_items('issue', only_issues)
+
+        # Only the issues returned for `state` tell us up to when it's
+        # complete, the ones in other states may have been updated later
+        current = [i for i in issues if i.state == state]
+        if current:
+            self.cache.set_watermark(self._key(state), newest(current))
+
+    def fetch(self, state, query):
+        """
+        Fetch every issue in ``state`` matching the filtered ``query``,
+        yielding the pages of issues as they arrive. Nothing is yielded if
+        they didn't change since the last fetch of the same query.
+
+        Once every page was consumed, the fetched issues are stored in the
+        cache along with the rest.
+        """
+        # An issue that stops matching may leave the listing without changing
+        # its first page, so longer listings aren't revalidated with an ETag
+        issues = []
+        for page in conditional_pages(self.cache, query.key(state),
+                                      partial(iter_issues, self.repo, query.params(state))):
+            only_issues = self._only_issues(page.items)
+            issues.extend(only_issues)
+            yield page._replace(items=only_issues)
+
+        self.cache.put_items('issue', issues)
+
+    def _pages(self, state, since=None):
+        key = self._key(state)
+        params = {'state': state, 'sort': 'updated'}
+        if since is not None:
+            key = '/'.join([key, 'since'])
+            params['since'] = since
+        # Sorted by last update, every change reaches the first page
+        return conditional_pages(self.cache, key,
+                                 partial(self.repo.iter_issues, **params),
+                                 changes_first=True)
+
+    @staticmethod
+    def _key(state):
+        return '/'.join(['issues', state])
+
+    @staticmethod
+    def _only_issues(issues):
+        # The issues endpoint returns pull requests too
+        return [i for i in issues if not i.pull_request]
@@ -2,14 +2,22 @@
 
 import time
 from calendar import timegm
+from collections import OrderedDict
 
 import urwid
 from x256 import x256
 
-from .config import DIVIDER
+from .config import (
+    DIVIDER,
+
+    KEY_NEXT_FILE, KEY_PREV_FILE, KEY_NEXT_HUNK, KEY_PREV_HUNK,
+)
 from .events import trigger
+from .executor import Token
+from .instrument import timed
 from .models import is_issue, is_pull_request, is_open
-from .func import unlines
+from .store import item_key
+from .query import Query, SORTS
 
 
 def issue_title(issue):
@@ -61,8 +69,8 @@ def pr_author(pr):
                        ("text", " opened this pull request")])
 
 
-def pr_comments(pr):
-    comments = len([_ for _ in pr.iter_comments()])
+def pr_comments(summary):
+    comments = summary.comments
 
     if not comments:
         return None
@@ -75,8 +83,8 @@ def pr_comments(pr):
     return urwid.Text(("text", text))
 
 
-def pr_commits(pr):
-    commits = len([_ for _ in pr.iter_commits()])
+def pr_commits(summary):
+    commits = summary.commits
     if commits == 1:
         text = "1 commit"
     else:
@@ -85,22 +93,16 @@ def pr_commits(pr):
     return urwid.Text(("text", text))
 
 
-def pr_additions(pr):
-    additions = sum([file.additions for file in pr.iter_files()])
+def pr_additions(summary):
+    additions = summary.additions
     return urwid.Text([("green_text", "+"), ("text", " %s additions" % additions)])
 
 
-def pr_deletions(pr):
-    deletions = sum([file.deletions for file in pr.iter_files()])
+def pr_deletions(summary):
+    deletions = summary.deletions
     return urwid.Text([("red_text", "-"), ("text", " %s deletions" % deletions)])
 
 
-def pr_diff(pr):
-    raw_diff = bytes.decode(pr.diff())[2:]
-    return raw_diff[:-1]
-
-
-
 pr_title = issue_title
 #pr_assignee = issue_assignee
 #pr_milestone = issue_assignee
@@ -172,8 +174,19 @@ class UI(urwid.WidgetWrap):
     def __init__(self, repo):
         self.repo = repo
         self.views = {}
-
-        header = urwid.Text("shipit")
+        self.labels = []
+        self.milestones = []
+        self.pr_summaries = None
+        self.highlighter = None
+        self.hud = None
+        # The keys of the items with changes being sent to GitHub
+        self.sending = set()
+
+        self.header = urwid.Text("shipit")
+        # Status of background work, shown at the right of the header
+        self.status = OrderedDict()
+        self.status_text = urwid.Text("", align='right')
+        header = urwid.Columns([self.header, self.status_text])
 
         # body
         body = urwid.Text("shipit")
@@ -192,11 +205,12 @@ class UI(urwid.WidgetWrap):
         """
         body = self.frame.body
 
+        if isinstance(body, Diff):
+            return body.pr
+
         widget = body.focus.focus
 
-        if isinstance(body, Diff):
-            focused = body.pr
-        elif not widget:
+        if not widget:
             focused = None
         elif isinstance(widget, PRDetailWidget):
             focused = widget.pr
@@ -212,12 +226,90 @@ class UI(urwid.WidgetWrap):
         issue = self.get_focused_item()
         return issue if is_issue(issue) else None
 
+    def set_labels(self, labels):
+        """Set the labels of the repository, used for filtering."""
+        self.labels = labels
+
+        if self.views.get("issues", None):
+            self.views["issues"].controls.set_labels(labels)
+
+    def set_repository(self, repo):
+        """Show the up to date ``repo`` from the next view on."""
+        self.repo = repo
+
+    def set_milestones(self, milestones):
+        """Set the milestones of the repository, used for filtering."""
+        self.milestones = milestones
+
+        if self.views.get("issues", None):
+            self.views["issues"].controls.set_milestones(milestones)
+
+    def set_pr_summaries(self, summaries):
+        """Set the ``PRSummaries`` the pull request rows get their counts from."""
+        self.pr_summaries = summaries
+        summaries.on_summary(self.on_pr_summary)
+
+    def set_highlighter(self, highlighter):
+        """Set the ``Highlighter`` of the code in diffs."""
+        self.highlighter = highlighter
+
+    def on_pr_summary(self, pr):
+        self.invalidate(pr)
+
+    def invalidate(self, item):
+        """Show the changes made to ``item`` in place in the list."""
+        if self.views.get("issues", None):
+            self.views["issues"].invalidate(item)
+
+    def set_status(self, name, text=None):
+        """
+        Show ``text`` as the ``name`` status in the header, or stop showing it
+        if ``text`` is ``None``.
+        """
+        if text is None:
+            self.status.pop(name, None)
+        else:
+            self.status[name] = text
+        self.status_text.set_text(" · ".join(self.status.values()))
+
+    def toggle_hud(self):
+        """Show or hide the HUD over the current view."""
+        if self.hud is None:
+            self.hud = HUD()
+            self._w = HUDOverlay(self.hud, self.frame)
+        else:
+            self.hud = None
+            self._w = self.frame
+
+    def set_hud(self, stats):
+        """Show the ``(name, value)`` pairs of ``stats`` in the HUD."""
+        if self.hud is not None:
+            self.hud.set_stats(stats)
+
+    def widget_counts(self):
+        """Return the number of widgets built for the list and the diff."""
+        counts = OrderedDict()
+        if self.views.get("issues", None):
+            counts["list"] = self.views["issues"].issues.body.widget_count()
+        if isinstance(self.frame.body, Diff) and self.frame.body.diff is not None:
+            counts["diff"] = self.frame.body.body.widget_count()
+        return counts
+
+    def loading(self, pages, total):
+        """Show the progress of loading the issues or pull requests."""
+        if pages is None:
+            self.set_status("loading")
+        else:
+            self.set_status("loading", "Loading page %s of ~%s" % (pages, total))
+
     # -- Modes ----------------------------------------------------------------
 
+    @timed("view.list")
     def issues_and_pulls(self, issues_and_pulls):
         header_text = self.HEADER_ISSUE_LIST.format(owner=(str(self.repo.owner)),
                                                     repo=self.repo.name)
-        self.frame.header.set_text(header_text)
+        self.header.set_text(header_text)
+        self.set_status("diff")
 
         if isinstance(self.frame.body, ListWidget):
             self.frame.body.reset_list(issues_and_pulls)
@@ -225,34 +317,105 @@ class UI(urwid.WidgetWrap):
 
         if self.views.get("issues", None):
             body = self.views["issues"]
+            body.reset_list(issues_and_pulls)
         else:
-            body = ListWidget(self.repo, issues_and_pulls)
+            body = ListWidget(self.repo,
+                              issues_and_pulls,
+                              self.labels,
+                              self.milestones,
+                              self.pr_summaries,
+                              self.sending)
             self.views["issues"] = body
             #self.frame.body = body
 
         self.frame.set_body(body)
 
-    def issue(self, issue):
+    @timed("view.list_delta")
+    def update_issues_and_pulls(self, delta):
+        """Apply the ``delta`` to the list of issues and pull requests."""
+        if self.views.get("issues", None):
+            self.views["issues"].apply(delta)
+
+    @timed("view.issue")
+    def issue(self, issue, comments, pending=(), sending=False):
+        """
+        Render a detail view for ``issue`` with its ``comments`` and the
+        ``pending`` ones not sent yet, marked as ``sending`` changes.
+        """
         header_text = self.HEADER_ISSUE_DETAIL.format(owner=(str(self.repo.owner)),
                                                       repo=self.repo.name,
                                                       num=issue.number,
                                                       title=issue.title,)
-        self.frame.header.set_text(header_text)
-        body = issue_detail(issue)
+        self.header.set_text(header_text)
+        self.set_status("diff")
+        body = IssueDetail(issue, comments, pending, sending)
         self.frame.set_body(body)
 
-    def pull_request(self, pr):
+    def update_issue(self, issue, sending=False, pending=None):
+        """
+        Show the changes made to ``issue`` in the list row and detail view
+        showing it, marking it as ``sending`` changes to GitHub.
+        """
+        if sending:
+            self.sending.add(item_key(issue))
+        else:
+            self.sending.discard(item_key(issue))
+        self.invalidate(issue)
+
+        detail = self.issue_detail_of(issue)
+        if detail is not None:
+            detail.set_issue(issue, sending)
+            detail.set_comments(pending=pending)
+
+    def update_comments(self, issue_or_pr, comments):
+        """Show the ``comments`` of ``issue_or_pr`` if its detail is shown."""
+        if is_pull_request(issue_or_pr):
+            detail = self.pr_detail_of(issue_or_pr)
+        else:
+            detail = self.issue_detail_of(issue_or_pr)
+        if detail is not None:
+            detail.set_comments(comments)
+
+    def issue_detail_of(self, issue):
+        body = self.frame.body
+        if isinstance(body, IssueDetail) and body.issue.number == issue.number:
+            return body
+        return None
+
+    @timed("view.pull_request")
+    def pull_request(self, pr, comments, summary):
         """Render a detail view for the `pr` pull request."""
         header_text = self.HEADER_PR_DETAIL.format(owner=(str(self.repo.owner)),
                                                    repo=self.repo.name,
                                                    num=pr.number,
                                                    title=pr.title,)
-        self.frame.header.set_text(header_text)
-        self.frame.body = pull_request_detail(pr)
-        self.frame.set_body(self.frame.body)
+        self.header.set_text(header_text)
+        self.set_status("diff")
+        self.frame.set_body(PRDetail(pr, comments, summary))
+
+    def update_pr_summary(self, pr, summary):
+        """Show the ``summary`` of ``pr`` if its detail is shown."""
+        detail = self.pr_detail_of(pr)
+        if detail is not None:
+            detail.set_summary(summary)
 
-    def diff(self, pr):
-        self.frame.body = Diff(pr)
+    def pr_detail_of(self, pr):
+        body = self.frame.body
+        if isinstance(body, PRDetail) and body.pr.number == pr.number:
+            return body
+        return None
+
+    @timed("view.diff")
+    def diff(self, pr, diff=None, message="Loading diff...", stats=None):
+        """
+        Render the ``diff`` of the ``pr`` pull request, or ``message`` if it
+        isn't available. The totals of the ``FileStat`` list ``stats`` are
+        shown in the header.
+        """
+        self.set_status("diff", diff_stats(stats) if stats else None)
+        if isinstance(self.frame.body, Diff):
+            self.frame.body.close()
+        self.frame.body = Diff(pr, diff, message, self.highlighter)
         self.frame.set_body(self.frame.body)
 
 
@@ -264,17 +427,21 @@ class IssueListWidget(urwid.WidgetWrap):
     HEADER_FORMAT = "#{num} ─ {title}       "
     BODY_FORMAT = "by {author}  {time}      {comments}"
 
-    def __init__(self, issue):
+    def __init__(self, issue, sending=False):
         self.issue = issue
 
-        widget = self._build_widget(issue)
+        widget = self._build_widget(issue, sending)
 
         super().__init__(widget)
 
     @classmethod
-    def _build_widget(cls, issue):
+    @timed("widget.issue_row")
+    def _build_widget(cls, issue, sending=False):
         """Return a widget for the ``issue``."""
-        number = urwid.Text([("number", "#%s" % issue.number)])
+        number = [("number", "#%s" % issue.number)]
+        if sending:
+            number.append(("pending_text", "\n⟳"))
+        number = urwid.Text(number)
 
         title = issue_title(issue)
         labels = cls._create_label_widgets(issue)
@@ -316,9 +483,19 @@ class PRListWidget(IssueListWidget):
     """
     Widget containing a Pull Requests's basic information, meant to be rendered
     on a list.
+
+    The ``summary`` of the pull request can be ``None`` if it isn't known yet.
     """
+    def __init__(self, pr, summary=None):
+        self.issue = pr
+
+        widget = self._build_widget(pr, summary)
+
+        super(IssueListWidget, self).__init__(widget)
+
     @classmethod
-    def _build_widget(cls, pr):
+    @timed("widget.pr_row")
+    def _build_widget(cls, pr, summary):
         """Return a widget for the ``pr``."""
         number = urwid.Text([("pull", "PR\n#%s" % pr.number)])
 
@@ -331,7 +508,7 @@ class PRListWidget(IssueListWidget):
         widget_list = [title,
                        author_time,]
 
-        comments = pr_comments(pr)
+        comments = pr_comments(summary) if summary else None
         if comments:
             widget_list.append(comments)
 
@@ -341,71 +518,234 @@ class PRListWidget(IssueListWidget):
         return box(widget)
 
 
-def issue_detail(issue):
-    comments = [IssueCommentWidget(issue, comment) for comment in issue.iter_comments()]
-    comments.insert(0, IssueDetailWidget(issue))
+def state_indicator(item, sending=False):
+    text = " Open " if is_open(item) else " Closed "
+    if sending:
+        attr = "pending"
+    else:
+        attr = "green" if is_open(item) else "red"
+    return urwid.Text((attr, text), align='center')
 
-    thread = urwid.ListBox(urwid.SimpleListWalker(comments))
 
-    info_widgets = []
-    if is_open(issue):
-        state_indicator = urwid.Text(("green", " Open "), align='center')
-    else:
-        state_indicator = urwid.Text(("red", " Closed "), align='center')
+class IssueDetail(urwid.Columns):
+    """
+    The detail of an issue with its comments, followed by the ``pending``
+    comments not sent yet.
 
-    info_widgets.append(state_indicator)
-    info_widgets.append(issue_comments(issue))
+    The issue and its comments can be updated without building the rest of
+    the view again, keeping what the user is reading on screen.
+    """
+    def __init__(self, issue, comments, pending=(), sending=False):
+        self.issue = issue
+        self.comments = comments
+        self.pending = pending
+        self.thread = urwid.SimpleListWalker([IssueDetailWidget(issue)])
+        self.info = urwid.SimpleListWalker([])
 
-    label_widgets = [make_divider(), Legend("Labels"), urwid.Text("")]
-    label_widgets.extend([create_label_widget(label) for label in issue.labels])
+        super().__init__([(110, urwid.ListBox(self.thread)),
+                          (3, make_vertical_divider()),
+                          urwid.ListBox(self.info)])
 
-    info_widgets.extend(label_widgets)
+        self.set_issue(issue, sending)
+        self.set_comments(comments, pending)
 
-    info = urwid.ListBox(urwid.SimpleListWalker(info_widgets))
-    vertical_divider = make_vertical_divider()
+    def set_issue(self, issue, sending=False):
+        """Show ``issue``, marked as ``sending`` changes to GitHub."""
+        self.issue = issue
+        self.thread[0] = IssueDetailWidget(issue)
+        # The focused comment gives the issue the actions are made to
+        for widget in self.thread[1:]:
+            widget.issue = issue
+
+        info_widgets = [state_indicator(issue, sending),
+                        issue_comments(issue),
+                        make_divider(),
+                        Legend("Labels"),
+                        urwid.Text("")]
+        info_widgets.extend([create_label_widget(label) for label in issue.labels])
+        self.info[:] = info_widgets
+
+    def set_comments(self, comments=None, pending=None):
+        """Show the ``comments`` and the ``pending`` ones, if given."""
+        if comments is not None:
+            self.comments = comments
+            self.thread[1:] = [IssueCommentWidget(self.issue, comment)
+                               for comment in comments]
+        if pending is not None:
+            self.pending = pending
+
+        # The pending comments go after the rest
+        start = 1 + len(self.comments)
+        self.thread[start:] = [PendingCommentWidget(self.issue, body)
+                               for body in self.pending]
+
+
+class PRDetail(urwid.Columns):
+    """
+    The detail of a pull request with its comments, and the ``summary`` of
+    its commits and changes at the side.
+
+    The comments and the summary can be updated without building the rest of
+    the view again, keeping what the user is reading on screen.
+    """
+    def __init__(self, pr, comments, summary):
+        self.pr = pr
+        self.thread = urwid.SimpleListWalker([PRDetailWidget(pr)])
+        # TODO: don't allow selection
+        self.info = urwid.SimpleListWalker([])
 
-    widget = urwid.Columns([(110, thread), (3, vertical_divider), info])
+        super().__init__([(110, urwid.ListBox(self.thread)),
+                          (3, make_vertical_divider()),
+                          urwid.ListBox(self.info)])
 
-    return widget
+        self.set_comments(comments)
+        self.set_summary(summary)
 
+    def set_comments(self, comments):
+        self.thread[1:] = [PRCommentWidget(self.pr, comment) for comment in comments]
 
-def pull_request_detail(pr):
-    comments = [PRCommentWidget(pr, comment) for comment in pr.iter_comments()]
-    comments.insert(0, PRDetailWidget(pr))
+    def set_summary(self, summary):
+        info_widgets = [state_indicator(self.pr)]
 
-    thread = urwid.ListBox(urwid.SimpleListWalker(comments))
+        if summary is None:
+            info_widgets.append(urwid.Text(("text", "...")))
+        else:
+            info_widgets.append(pr_commits(summary))
+            info_widgets.append(pr_additions(summary))
+            info_widgets.append(pr_deletions(summary))
 
-    info_widgets = []
-    if is_open(pr):
-        state_indicator = urwid.Text(("green", " Open "), align='center')
-    else:
-        state_indicator = urwid.Text(("red", " Closed "), align='center')
+        self.info[:] = info_widgets
 
-    info_widgets.append(state_indicator)
-    info_widgets.append(pr_commits(pr))
 
-    additions = pr_additions(pr)
-    deletions = pr_deletions(pr)
+@timed("widget.list_row")
+def issue_list_widget(issue, pr_summaries=None, sending=False):
+    if is_issue(issue):
+        return IssueListWidget(issue, sending)
+    elif is_pull_request(issue):
+        if pr_summaries is None:
+            return PRListWidget(issue)
+        # The widget is rebuilt when the summary arrives
+        pr_summaries.request(issue)
+        return PRListWidget(issue, pr_summaries.get(issue))
 
-    info_widgets.append(additions)
-    info_widgets.append(deletions)
 
-    # TODO: don't allow selection
-    info = urwid.ListBox(urwid.SimpleListWalker(info_widgets))
+def issue_list(issues, pr_summaries=None):
+    for issue in issues:
+        widget = issue_list_widget(issue, pr_summaries)
+        if widget is not None:
+            yield widget
 
-    vertical_divider = make_vertical_divider()
 
-    widget = urwid.Columns([(110, thread), (3, vertical_divider), info])
+class LazyListWalker(urwid.ListWalker):
+    """
+    A list walker over issues and pull requests that only builds the widgets
+    of the rows the ``ListBox`` asks for, which are the ones on screen and
+    their neighbours.
+
+    The built widgets are cached, evicting the least recently used ones when
+    there are more than ``max_widgets``. A cached widget is rebuilt only when
+    its item is replaced or updated. The items whose keys are in ``sending``
+    are marked as having changes being sent.
+    """
+    def __init__(self, items, pr_summaries=None, sending=(), max_widgets=256):
+        self.items = []
+        self.focus = 0
+        self.pr_summaries = pr_summaries
+        self.sending = sending
+        self.max_widgets = max_widgets
+        self._widgets = OrderedDict()
+        self.set_items(items)
+
+    def set_items(self, items):
+        """Show ``items``, keeping the focus on the same item if possible."""
+        self._replace_items(items)
+
+        # Forget the widgets of items that are no longer shown
+        keys = set(item_key(item) for item in self.items)
+        for key in [k for k in self._widgets if k not in keys]:
+            del self._widgets[key]
+
+        self._modified()
+        self._focus_changed()
+
+    def apply(self, delta):
+        """
+        Show the items of ``delta``, only discarding the widgets of the
+        removed and updated items.
+        """
+        for item in delta.removed + delta.updated:
+            self._widgets.pop(item_key(item), None)
 
-    return widget
+        self._replace_items(delta.items)
+        self._modified()
+        self._focus_changed()
 
+    def invalidate(self, item):
+        """Rebuild the widget of ``item`` the next time it's shown."""
+        if self._widgets.pop(item_key(item), None) is not None:
+            self._modified()
 
-def issue_list(issues):
-    for issue in issues:
-        if is_issue(issue):
-            yield IssueListWidget(issue)
-        elif is_pull_request(issue):
-            yield PRListWidget(issue)
+    def _replace_items(self, items):
+        focused = self.items[self.focus] if self.items else None
+
+        self.items = list(items)
+
+        if focused is not None:
+            key = item_key(focused)
+            for position, item in enumerate(self.items):
+                if item_key(item) == key:
+                    self.focus = position
+                    return
+
+        self.focus = min(self.focus, max(len(self.items) - 1, 0))
+
+    def widget_count(self):
+        return len(self._widgets)
+
+    def widget(self, position):
+        """Return the widget for the item in ``position``, building it if needed."""
+        item = self.items[position]
+        key = item_key(item)
+
+        cached = self._widgets.get(key, None)
+        if cached is not None:
+            cached_item, updated_at, widget = cached
+            if cached_item is item and updated_at == item.updated_at:
+                self._widgets.move_to_end(key)
+                return widget
+
+        widget = issue_list_widget(item, self.pr_summaries, key in self.sending)
+        self._widgets[key] = (item, item.updated_at, widget)
+        self._widgets.move_to_end(key)
+        while len(self._widgets) > self.max_widgets:
+            self._widgets.popitem(last=False)
+
+        return widget
+
+    # -- ListWalker API -------------------------------------------------------
+
+    def get_focus(self):
+        if not self.items:
+            return None, None
+        return self.widget(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+        self._focus_changed()
+
+    def _focus_changed(self):
+        trigger("focus_item", self.items, self.focus)
+
+    def get_next(self, position):
+        if position + 1 >= len(self.items):
+            return None, None
+        return self.widget(position + 1), position + 1
+
+    def get_prev(self, position):
+        if position <= 0:
+            return None, None
+        return self.widget(position - 1), position - 1
 
 
 class ListWidget(urwid.Columns):
@@ -413,36 +753,75 @@ class ListWidget(urwid.Columns):
     A widget that represents a list of issues and Pull Requests, along with
     controls for sorting and filtering the aforementioned entities.
     """
-    def __init__(self, repo, items):
-        issue_widgets = [w for w in issue_list(items)]
-
-        self.issues = urwid.ListBox(urwid.SimpleListWalker(issue_widgets))
+    def __init__(self, repo, items, labels, milestones=(), pr_summaries=None,
+                 sending=()):
+        self.issues = urwid.ListBox(LazyListWalker(items, pr_summaries, sending))
         vertical_divider = make_vertical_divider()
-        self.controls = Controls(repo, items)
+        self.controls = Controls(repo, items, labels, milestones)
 
         super().__init__([(90, self.issues),
                           (3, vertical_divider),
                           self.controls])
 
     def reset_list(self, items):
-        widgets = [w for w in issue_list(items)]
-        list_walker = self.issues.body
-        del list_walker[:]
-        list_walker.extend(widgets)
+        self.issues.body.set_items(items)
+
+    def apply(self, delta):
+        self.issues.body.apply(delta)
+
+    def invalidate(self, item):
+        self.issues.body.invalidate(item)
 
 
 class Controls(urwid.ListBox):
-    # TODO: Milestone
-    # TODO: Assigned to you, Created by you
-    def __init__(self, repo, issues):
+    """
+    The filters of the issues and pull requests. Changing any of them but
+    the state triggers ``filter_items`` with the ``Query`` of all of them.
+    """
+    def __init__(self, repo, issues, labels, milestones=()):
         self.repo = repo
         self.issues = issues
+        self.query = Query()
+
+        self.state_filters = self._build_state_filters()
+        self.sort_filters = self._build_sort_filters()
+        self.user_filters = self._build_user_filters()
+        self.milestone_filters = self._build_milestone_filters(milestones)
+        self.label_filters = self._build_label_filters(labels)
+
+        super().__init__(urwid.SimpleListWalker(self._controls()))
+
+    def set_labels(self, labels):
+        """Replace the label filters, keeping the rest of the controls."""
+        self.label_filters = self._build_label_filters(labels)
+        self.body[:] = self._controls()
+
+    def set_milestones(self, milestones):
+        """Replace the milestone filters, keeping the rest of the controls."""
+        self.milestone_filters = self._build_milestone_filters(milestones)
+        self.body[:] = self._controls()
+
+    def filter(self, **changes):
+        self.query = self.query._replace(**changes)
+        trigger("filter_items", self.query)
+
+    def toggle_label(self, name, checked):
+        labels = set(self.query.labels)
+        if checked:
+            labels.add(name)
+        else:
+            labels.discard(name)
+        self.filter(labels=tuple(sorted(labels)))
 
-        widgets = self._build_widgets()
-
-        super().__init__(urwid.SimpleListWalker(widgets))
+    def _controls(self):
+        return (self.state_filters +
+                self.sort_filters +
+                self.user_filters +
+                self.milestone_filters +
+                self.label_filters)
 
-    def _build_widgets(self):
+    @staticmethod
+    def _build_state_filters():
         br = Legend("")
         controls = []
         # Open/Closed/Pull Request
@@ -453,11 +832,48 @@ class Controls(urwid.ListBox):
                          PullRequestsFilter(filters),])
         controls.append(br)
 
-        # Labels
-        labels = [LabelWidget(label) for label in self.repo.iter_labels()]
-        labels.insert(0, Legend("Filter by label\n"))
+        return controls
+
+    def _build_sort_filters(self):
+        br = Legend("")
+        filters = []
+        controls = [SortFilter(filters, sort, self.query.sort == sort, self.filter)
+                    for sort in SORTS]
+        controls.insert(0, Legend("Sort by\n"))
+        controls.append(br)
+
+        return controls
 
-        controls.extend(labels)
+    def _build_user_filters(self):
+        br = Legend("")
+        controls = [Legend("Filter by user\n"),
+                    LoginFilter("Assignee: ", self.query.assignee,
+                                lambda login: self.filter(assignee=login)),
+                    LoginFilter("Author:   ", self.query.creator,
+                                lambda login: self.filter(creator=login)),
+                    br]
+
+        return controls
+
+    def _build_milestone_filters(self, milestones):
+        if not milestones:
+            return []
+
+        br = Legend("")
+        filters = []
+        controls = [MilestoneFilter(filters, None, self.query.milestone, self.filter)]
+        controls.extend(MilestoneFilter(filters, milestone, self.query.milestone, self.filter)
+                        for milestone in milestones)
+        controls.insert(0, Legend("Filter by milestone\n"))
+        controls.append(br)
+
+        return controls
+
+    def _build_label_filters(self, labels):
+        br = Legend("")
+        controls = [LabelWidget(label, label.name in self.query.labels, self.toggle_label)
+                    for label in labels]
+        controls.insert(0, Legend("Filter by label\n"))
         controls.append(br)
 
         return controls
@@ -475,10 +891,10 @@ class Legend(urwid.Text):
 
 
 class RadioButtonWrap(urwid.WidgetWrap):
-    def __init__(self, filters, label, check=None):
+    def __init__(self, filters, label, check=None, state="first True"):
         self.chec = check
 
-        widget = urwid.RadioButton(filters, label)
+        widget = urwid.RadioButton(filters, label, state)
 
         urwid.connect_signal(widget, "change", self.on_change)
 
@@ -517,14 +933,65 @@ class PullRequestsFilter(RadioButtonWrap):
         trigger("show_pull_requests")
 
 
+class SortFilter(RadioButtonWrap):
+    def __init__(self, filters, sort, checked, on_filter):
+        super().__init__(filters, sort.capitalize(), state=checked)
+        self.sort = sort
+        self.on_filter = on_filter
+
+    def on_check(self):
+        self.on_filter(sort=self.sort)
+
+
+class MilestoneFilter(RadioButtonWrap):
+    """Filter by ``milestone``, or show any milestone when it's ``None``."""
+    def __init__(self, filters, milestone, selected, on_filter):
+        self.number = milestone.number if milestone else None
+        label = milestone.title if milestone else "Any"
+        super().__init__(filters, label, state=self.number == selected)
+        self.on_filter = on_filter
+
+    def on_check(self):
+        self.on_filter(milestone=self.number)
+
+
+class LoginFilter(urwid.WidgetWrap):
+    """
+    Edit a login to filter by, calling ``on_login`` with it on enter or
+    with ``None`` if it's empty.
+    """
+    def __init__(self, caption, login, on_login):
+        self.edit = urwid.Edit(("legend", caption), login or "")
+        self.on_login = on_login
+        super().__init__(urwid.AttrMap(self.edit, "checkbox", "focus"))
+
+    def keypress(self, size, key):
+        if key == "enter":
+            self.on_login(self.edit.edit_text.strip() or None)
+            return None
+        return super().keypress(size, key)
+
+
 class LabelWidget(urwid.WidgetWrap):
-    """Represent a label."""
-    def __init__(self, label):
-        checkbox = urwid.AttrMap(urwid.CheckBox(" "), "checkbox", "focus")
+    """
+    Represent a label, calling ``on_toggle`` with its name and whether it's
+    checked when its checkbox changes.
+    """
+    def __init__(self, label, checked=False, on_toggle=None):
+        self.label = label
+        self.on_toggle = on_toggle
+
+        checkbox = urwid.CheckBox(" ", checked)
+        urwid.connect_signal(checkbox, "change", self.on_change)
+        checkbox = urwid.AttrMap(checkbox, "checkbox", "focus")
         label_widget = create_label_widget(label)
         widget = urwid.Columns([(5, checkbox), label_widget])
         super().__init__(widget)
 
+    def on_change(self, checkbox, new_state):
+        if callable(self.on_toggle):
+            self.on_toggle(self.label.name, new_state)
+
 
 class IssueDetailWidget(urwid.WidgetWrap):
     """
@@ -715,49 +1182,224 @@ class PRDetailWidget(urwid.WidgetWrap):
         return key
 
 
+class PendingCommentWidget(urwid.WidgetWrap):
+    """A comment on ``issue`` that hasn't been sent to GitHub yet."""
+    def __init__(self, issue, body):
+        self.issue = issue
+
+        header = urwid.Text(("pending_text", "Sending comment..."))
+        body = urwid.Padding(urwid.Text(("body", body)), left=2, right=2)
+        widget = urwid.Pile([header, make_divider(), body])
+
+        super().__init__(box(widget))
+
+    def selectable(self):
+        return True
+
+    def keypress(self, size, key):
+        return key
+
+
 # TODO: Base CommentWidget
 class PRCommentWidget(IssueCommentWidget):
     def __init__(self, pr, comment):
         self.pr = pr
-        self.comment = comment
-
-        header_text = self._create_header(comment)
-        body_text = self._create_body(comment)
 
-        widget = self._build_widget(header_text, body_text)
-
-        super(IssueCommentWidget, self).__init__(widget)
+        super().__init__(pr, comment)
 
     @classmethod
     def _create_body(cls, comment):
-        return cls.BODY_FORMAT.format(
-            body=comment.body,
-        )
+        widget = urwid.Text(("body", comment.body))
+        return urwid.Padding(widget, left=2, right=2)
+
+
+def diff_stats(stats):
+    # Binary files have no line counts
+    additions = sum(stat.additions or 0 for stat in stats)
+    deletions = sum(stat.deletions or 0 for stat in stats)
+    return "%s files, +%s -%s" % (len(stats), additions, deletions)
+
+
+def diff_line_attr(line):
+    """Return the display attribute of a ``line`` of a unified diff."""
+    if line.startswith("diff"):
+        return "text"
+    elif line.startswith("index"):
+        return "text"
+    elif line.startswith("@@"):
+        return "cyan_text"
+    elif line.startswith("+++"):
+        return "text"
+    elif line.startswith("+"):
+        return "green_text"
+    elif line.startswith("---"):
+        return "text"
+    elif line.startswith("-"):
+        return "red_text"
+    else:
+        return "code"
+
+
+class DiffWalker(urwid.ListWalker):
+    """
+    A list walker over the lines of a ``DiffBuffer`` that only builds the
+    widgets of the lines the ``ListBox`` asks for, keeping the last
+    ``max_widgets`` built.
+
+    Lines are shown coloured by their prefix, and upgraded when the
+    ``highlighter`` finishes highlighting the file they are in.
+    """
+    def __init__(self, diff, highlighter=None, max_widgets=512):
+        self.diff = diff
+        self.highlighter = highlighter
+        self.focus = 0
+        self.max_widgets = max_widgets
+        self.token = Token()
+        self._widgets = OrderedDict()
+        self._highlighted = {}
+        self._requested = set()
+
+    def widget_count(self):
+        return len(self._widgets)
+
+    def widget(self, number):
+        widget = self._widgets.get(number, None)
+        if widget is not None:
+            self._widgets.move_to_end(number)
+            return widget
+        return self._build_widget(number)
+
+    @timed("widget.diff_line")
+    def _build_widget(self, number):
+        markup = self._highlighted.get(number, None)
+        if markup is None:
+            line = self.diff.line(number)
+            markup = (diff_line_attr(line), line)
+            self._highlight(number)
+
+        widget = urwid.Text(markup)
+        self._widgets[number] = widget
+        while len(self._widgets) > self.max_widgets:
+            self._widgets.popitem(last=False)
+
+        return widget
+
+    def _highlight(self, number):
+        if self.highlighter is None:
+            return
+
+        index = self.diff.file_of(number)
+        if index < 0 or index in self._requested:
+            return
+
+        self._requested.add(index)
+        self.highlighter.request(self.diff, index, self._on_highlighted,
+                                 token=self.token)
+
+    def _on_highlighted(self, start, markups):
+        for number, markup in enumerate(markups, start):
+            if markup is None:
+                continue
+            self._highlighted[number] = markup
+            widget = self._widgets.get(number, None)
+            if widget is not None:
+                widget.set_text(markup)
+        self._modified()
+
+    # -- ListWalker API -------------------------------------------------------
+
+    def get_focus(self):
+        if not len(self.diff):
+            return None, None
+        return self.widget(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        if position + 1 >= len(self.diff):
+            return None, None
+        return self.widget(position + 1), position + 1
+
+    def get_prev(self, position):
+        if position <= 0:
+            return None, None
+        return self.widget(position - 1), position - 1
 
 
 class Diff(urwid.ListBox):
-    def __init__(self, pr):
+    """
+    The diff of a pull request, or ``message`` while it isn't available.
+
+    The lines are built as they are shown so huge diffs open instantly, and
+    the start of the next or previous file or hunk can be jumped to.
+    """
+    def __init__(self, pr, diff=None, message="Loading diff...", highlighter=None):
         self.pr = pr
-        self.diff = pr_diff(pr)
-        super().__init__(urwid.SimpleListWalker([l for l in
-                                                 self._build_lines(self.diff)]))
+        self.diff = diff
 
-    @staticmethod
-    def _build_lines(diff):
-        for line in unlines(diff):
-            if line.startswith("ff"):
-                yield urwid.Text(("text", line))
-            elif line.startswith("index"):
-                yield urwid.Text(("text", line))
-            elif line.startswith("@@"):
-                yield urwid.Text(("cyan_text", line))
-            elif line.startswith("+++"):
-                yield urwid.Text(("text", line))
-            elif line.startswith("+"):
-                yield urwid.Text(("green_text", line))
-            elif line.startswith("---"):
-                yield urwid.Text(("text", line))
-            elif line.startswith("-"):
-                yield urwid.Text(("red_text", line))
-            else:
-                yield urwid.Text(("code", line))
+        if diff is None:
+            walker = urwid.SimpleListWalker([urwid.Text(("text", message))])
+        else:
+            walker = DiffWalker(diff, highlighter)
+
+        super().__init__(walker)
+
+    def close(self):
+        """Stop highlighting the diff."""
+        if self.diff is not None:
+            self.body.token.cancel()
+
+    def keypress(self, size, key):
+        if self.diff is None:
+            return super().keypress(size, key)
+
+        jumps = {
+            KEY_NEXT_FILE: self.diff.next_file,
+            KEY_PREV_FILE: self.diff.prev_file,
+            KEY_NEXT_HUNK: self.diff.next_hunk,
+            KEY_PREV_HUNK: self.diff.prev_hunk,
+        }
+        if key not in jumps:
+            return super().keypress(size, key)
+
+        position = jumps[key](self.body.focus)
+        if position is not None:
+            self.set_focus(position)
+            self.set_focus_valign('top')
+
+
+class HUD(urwid.WidgetWrap):
+    """Live performance numbers, shown over the views."""
+    def __init__(self):
+        self.text = urwid.Text("")
+        super().__init__(urwid.AttrMap(urwid.LineBox(self.text), "hud"))
+
+    def set_stats(self, stats):
+        width = max((len(name) for name, _ in stats), default=0)
+        self.text.set_text("\n".join("%s  %s" % (name.ljust(width), value)
+                                      for name, value in stats))
+
+
+class HUDOverlay(urwid.Overlay):
+    """
+    Show the ``HUD`` at the top right of the ``frame``, which keeps getting
+    the input.
+    """
+    WIDTH = 48
+
+    def __init__(self, hud, frame):
+        super().__init__(hud, frame,
+                         align='right', width=self.WIDTH,
+                         valign='top', height='pack',
+                         top=1)
+
+    def selectable(self):
+        return self.bottom_w.selectable()
+
+    def keypress(self, size, key):
+        return self.bottom_w.keypress(size, key)
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        return self.bottom_w.mouse_event(size, event, button, col, row, focus)
@@ -0,0 +1,37 @@
+import pytest
+from github3 import GitHubEnterprise
+
+from benchmarks.fake_github import FakeGitHub, Repository
+from shipit.cache import Cache
+from shipit.http import configure_session
+
+
+@pytest.fixture
+def serve():
+    """
+    Return a function that serves a fake ``repository`` of the given sizes
+    and returns the ``FakeGitHub`` and the github3 repository talking to it.
+    """
+    servers = []
+
+    def serve(repository=Repository, **sizes):
+        server = FakeGitHub(lambda url: repository(url, **sizes))
+        server.start()
+        servers.append(server)
+
+        api = GitHubEnterprise(server.base_url)
+        configure_session(api._session)
+        repo = api.repository(server.repo.owner, server.repo.name)
+        server.reset_count()
+        return server, repo
+
+    yield serve
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = Cache('octocat', 'shipit', str(tmp_path))
+    yield cache
+    cache.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from shipit import diff
+from shipit.diff import DiffBuffer
+
+RAW = b'''diff --git a/one.py b/one.py
+index 1111111..2222222 100644
+--- a/one.py
++++ b/one.py
+@@ -1,2 +1,2 @@
+-old
++new \xc3\xa9
+@@ -10,1 +10,1 @@
+ context\r
+diff --git a/two.py b/two.py
+--- a/two.py
++++ b/two.py
+@@ -1 +1 @@
++last line without newline'''
+
+
+@pytest.fixture(params=['bytes', 'mmap'])
+def buffer(request, monkeypatch):
+    if request.param == 'mmap':
+        monkeypatch.setattr(diff, 'MMAP_THRESHOLD', 0)
+    return DiffBuffer(RAW)
+
+
+def test_lines_are_decoded_without_line_breaks(buffer):
+    assert len(buffer) == 14
+    assert buffer.line(0) == 'diff --git a/one.py b/one.py'
+    assert buffer.line(6) == '+new é'
+    assert buffer.line(8) == ' context'
+    assert buffer.line(13) == '+last line without newline'
+
+
+def test_files_and_hunks_are_indexed(buffer):
+    assert buffer.files == [0, 9]
+    assert buffer.hunks == [4, 7, 12]
+    assert buffer.file_of(8) == 0
+    assert buffer.file_of(9) == 1
+    assert buffer.file_lines(0) == (0, 9)
+    assert buffer.file_lines(1) == (9, 14)
+
+
+def test_next_and_previous_file_and_hunk(buffer):
+    assert buffer.next_file(0) == 9
+    assert buffer.next_file(9) is None
+    assert buffer.prev_file(9) == 0
+    assert buffer.prev_file(0) is None
+    assert buffer.next_hunk(4) == 7
+    assert buffer.next_hunk(8) == 12
+    assert buffer.prev_hunk(12) == 7
+    assert buffer.prev_hunk(4) is None
+
+
+def test_empty_diff():
+    buffer = DiffBuffer(b'')
+    assert (len(buffer), buffer.files, buffer.hunks) == (0, [], [])
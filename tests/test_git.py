@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from shipit.git import parse_config, read_remotes, get_remotes, parse_remote_url
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """An empty home directory, so the user's git configuration isn't read."""
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(home / '.config'))
+    return home
+
+
+def clone(path, config):
+    """Create the git directory of a clone in ``path`` with ``config``."""
+    git_dir = path / '.git'
+    git_dir.mkdir(parents=True)
+    (git_dir / 'HEAD').write_text('ref: refs/heads/master\n')
+    (git_dir / 'config').write_text(config)
+    return str(git_dir)
+
+
+def test_parse_config():
+    text = '\n'.join([
+        '# a comment',
+        '[core]',
+        '\tbare = false ; another comment',
+        '[remote "origin"]',
+        '\turl = "git@github.com:owner/repo.git"  # quoted',
+        '\tfetch = +refs/heads/*:refs/remotes/origin/* \\',
+        '',
+        '[Branch.Master]',
+        '\tRebase',
+        '[alias] lg = "log \\"--oneline\\""',
+    ])
+
+    assert list(parse_config(text)) == [
+        ('core', None, 'bare', 'false'),
+        ('remote', 'origin', 'url', 'git@github.com:owner/repo.git'),
+        ('remote', 'origin', 'fetch', '+refs/heads/*:refs/remotes/origin/*'),
+        ('branch', 'Master', 'rebase', 'true'),
+        ('alias', None, 'lg', 'log "--oneline"'),
+    ]
+
+
+def test_insteadof_rewrites_with_the_longest_prefix(tmp_path, home):
+    (home / '.gitconfig').write_text('\n'.join([
+        '[url "https://github.com/"]',
+        '\tinsteadOf = gh:',
+        '[url "git@github.com:owner/"]',
+        '\tinsteadOf = gh:owner/',
+    ]))
+    git_dir = clone(tmp_path / 'repo', '\n'.join([
+        '[remote "origin"]',
+        '\turl = gh:owner/repo.git',
+        '[remote "upstream"]',
+        '\turl = gh:other/repo.git',
+    ]))
+
+    assert read_remotes(git_dir) == {
+        'origin': 'git@github.com:owner/repo.git',
+        'upstream': 'https://github.com/other/repo.git',
+    }
+
+
+def test_includeif_gitdir_only_applies_to_matching_clones(tmp_path, home):
+    (home / 'work.gitconfig').write_text('[url "git@github.com:"]\n\tinsteadOf = work:\n')
+    (home / '.gitconfig').write_text('[includeIf "gitdir:~/work/"]\n\tpath = work.gitconfig\n')
+    remote = '[remote "origin"]\n\turl = work:owner/repo\n'
+
+    inside = clone(home / 'work' / 'repo', remote)
+    outside = clone(tmp_path / 'repo', remote)
+
+    assert read_remotes(inside) == {'origin': 'git@github.com:owner/repo'}
+    assert read_remotes(outside) == {'origin': 'work:owner/repo'}
+
+
+def test_include_path_relative_to_the_including_file(tmp_path, home):
+    git_dir = clone(tmp_path / 'repo', '[include]\n\tpath = ../remotes.gitconfig\n')
+    with open(os.path.join(tmp_path, 'repo', 'remotes.gitconfig'), 'w') as f:
+        f.write('[remote "origin"]\n\turl = https://github.com/owner/repo\n')
+
+    assert read_remotes(git_dir) == {'origin': 'https://github.com/owner/repo'}
+
+
+def test_get_remotes_only_returns_github_ones(tmp_path, home, monkeypatch):
+    clone(tmp_path / 'repo', '\n'.join([
+        '[remote "origin"]',
+        '\turl = git@github.com:owner/repo.git',
+        '[remote "mirror"]',
+        '\turl = https://gitlab.com/owner/repo.git',
+    ]))
+    (tmp_path / 'repo' / 'src').mkdir()
+    monkeypatch.chdir(tmp_path / 'repo' / 'src')
+
+    assert get_remotes() == {'origin': 'git@github.com:owner/repo.git'}
+
+
+@pytest.mark.parametrize('url', [
+    'git@github.com:owner/repo.git',
+    'ssh://git@github.com/owner/repo.git',
+    'https://github.com/owner/repo',
+    'https://github.example.com/prefix/owner/repo.git',
+])
+def test_parse_remote_url(url):
+    host, user, repo = parse_remote_url(url)
+    assert (user, repo) == ('owner', 'repo')
+    assert 'github' in host
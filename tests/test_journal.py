@@ -0,0 +1,264 @@
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+import requests
+from github3.models import GitHubError
+from requests.exceptions import ConnectionError, ReadTimeout
+from urllib3.exceptions import NewConnectionError
+
+from shipit import journal
+from shipit.journal import (
+    Journal, CREATE, CLOSE, EDIT, COMMENT, SENT, CONFLICT, FAILED, OFFLINE
+)
+
+
+class Executor():
+    """Runs the work right away, as if a worker was always free."""
+    def submit(self, fn, callback=None, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as error:
+            future.set_exception(error)
+        callback(future)
+
+
+class Issue():
+    """An issue on GitHub, changed by the journal and by someone else."""
+    def __init__(self, repo, number, title='Title', body='Body'):
+        self.repo = repo
+        self.number = number
+        self.title = title
+        self.body = self.body_text = body
+        self.state = 'open'
+        self.updated_at = '2020-01-01 00:00:00+00:00'
+        self.comments = []
+
+    def touch(self):
+        self.updated_at = '2020-01-02 00:00:00+00:00'
+
+    def close(self):
+        self.repo.calls.append(('close', self.number))
+        self.state = 'closed'
+        return True
+
+    def reopen(self):
+        self.repo.calls.append(('reopen', self.number))
+        self.state = 'open'
+        return True
+
+    def edit(self, title, body):
+        self.repo.calls.append(('edit', self.number))
+        self.title, self.body = title, body
+        return True
+
+    def create_comment(self, body):
+        self.repo.calls.append(('comment', self.number))
+        comment = SimpleNamespace(user='me', body=body,
+                                  created_at=datetime.now(timezone.utc))
+        self.comments.append(comment)
+        self.touch()
+        self.repo.answer()
+        return comment
+
+
+class Repository():
+    """
+    The issues of a repository on GitHub. The next requests fail with the
+    ``errors``, and the answers to the next changes made are lost with the
+    ``lost`` errors.
+    """
+    def __init__(self):
+        self.issues = {}
+        self.calls = []
+        self.errors = []
+        self.lost = []
+
+    def request(self):
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def answer(self):
+        if self.lost:
+            raise self.lost.pop(0)
+
+    def issue(self, number):
+        self.request()
+        return self.issues.get(number, None)
+
+    def create_issue(self, title, body):
+        self.request()
+        self.calls.append(('create', title))
+        issue = Issue(self, len(self.issues) + 1, title, body)
+        self.issues[issue.number] = issue
+        self.answer()
+        return issue
+
+    def copy_of(self, number):
+        issue = self.issues[number]
+        copy = Issue(self, number, issue.title, issue.body)
+        copy.state, copy.updated_at = issue.state, issue.updated_at
+        return copy
+
+
+def github_error(status):
+    response = requests.Response()
+    response.status_code = status
+    response._content = b'{"message": "error"}'
+    return GitHubError(response)
+
+
+def not_connected():
+    return ConnectionError(NewConnectionError(None, 'Connection refused'))
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = Repository()
+    monkeypatch.setattr(journal, 'current_login', lambda repo: 'me')
+    monkeypatch.setattr(journal, 'iter_comments',
+                        lambda issue: repo.issues[issue.number].comments)
+    monkeypatch.setattr(journal, 'iter_issues',
+                        lambda repo, params: list(repo.issues.values()))
+    return repo
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def retries():
+    return []
+
+
+def make_journal(repo, cache, sent, retries):
+    j = Journal(repo, cache, Executor(), lambda delay, fn: retries.append(fn))
+    j.on_sent(lambda mutation, outcome, issue: sent.append((mutation.action, outcome)))
+    return j
+
+
+def test_changes_are_shown_on_copies_and_sent_in_order(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    j = make_journal(repo, cache, sent, retries)
+    shown = repo.copy_of(1)
+
+    closed = j.record(CLOSE, shown, old_state='open')
+    j.record(COMMENT, closed, body='Done')
+
+    assert closed.state == 'closed' and shown.state == 'open'
+    assert repo.calls == [('close', 1), ('comment', 1)]
+    assert sent == [(CLOSE, SENT), (COMMENT, SENT)]
+    assert j.pending == [] and cache.mutations() == []
+
+
+def test_overlay_shows_pending_changes_on_copies(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [not_connected()]
+    j = make_journal(repo, cache, sent, retries)
+
+    j.record(EDIT, repo.copy_of(1), title='New', body='Text',
+             old_title='Title', old_body='Body')
+
+    fetched = [repo.copy_of(1)]
+    overlaid, = j.overlay(fetched)
+    assert (overlaid.title, overlaid.body) == ('New', 'Text')
+    assert fetched[0].title == 'Title'
+
+
+def test_change_overwriting_a_newer_one_is_discarded(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [not_connected()]
+    j = make_journal(repo, cache, sent, retries)
+    j.record(EDIT, repo.copy_of(1), title='Mine', body='Body',
+             old_title='Title', old_body='Body')
+
+    # Someone else edits it before the change is sent
+    repo.issues[1].title = 'Theirs'
+    repo.issues[1].touch()
+    retries.pop()()
+
+    assert sent == [(EDIT, OFFLINE), (EDIT, CONFLICT)]
+    assert repo.issues[1].title == 'Theirs'
+    assert j.pending == []
+
+
+def test_change_to_an_issue_updated_otherwise_is_sent(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [not_connected()]
+    j = make_journal(repo, cache, sent, retries)
+    j.record(CLOSE, repo.copy_of(1), old_state='open')
+
+    repo.issues[1].touch()
+    retries.pop()()
+
+    assert sent == [(CLOSE, OFFLINE), (CLOSE, SENT)]
+    assert repo.issues[1].state == 'closed'
+
+
+def test_pending_changes_are_replayed_by_the_next_session(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [not_connected()]
+    j = make_journal(repo, cache, sent, retries)
+    j.record(CLOSE, repo.copy_of(1), old_state='open')
+    j.record(COMMENT, repo.copy_of(1), body='Closing')
+    assert len(cache.mutations()) == 2
+
+    j = make_journal(repo, cache, sent, retries)
+    j.replay()
+
+    assert repo.calls == [('close', 1), ('comment', 1)]
+    assert cache.mutations() == []
+
+
+def test_comment_that_reached_github_isnt_made_twice(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.lost = [ReadTimeout()]
+    j = make_journal(repo, cache, sent, retries)
+
+    j.record(COMMENT, repo.copy_of(1), body='Hello')
+    retries.pop()()
+
+    assert repo.calls.count(('comment', 1)) == 1
+    assert sent == [(COMMENT, OFFLINE), (COMMENT, SENT)]
+
+
+def test_issue_that_reached_github_isnt_created_twice(repo, cache, sent, retries):
+    repo.lost = [ReadTimeout()]
+    j = make_journal(repo, cache, sent, retries)
+
+    j.record(CREATE, title='New', body='Issue')
+    retries.pop()()
+
+    assert len(repo.issues) == 1
+    assert sent == [(CREATE, OFFLINE), (CREATE, SENT)]
+
+
+def test_comment_not_sent_for_lack_of_connection_is_sent(repo, cache, sent, retries):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [not_connected()]
+    j = make_journal(repo, cache, sent, retries)
+
+    j.record(COMMENT, repo.copy_of(1), body='Hello')
+    assert j._uncertain == set()
+    retries.pop()()
+
+    assert repo.calls == [('comment', 1)]
+
+
+@pytest.mark.parametrize('status, outcome', [(502, OFFLINE), (503, OFFLINE),
+                                             (504, OFFLINE), (500, FAILED),
+                                             (422, FAILED)])
+def test_only_unavailable_answers_are_retried(repo, cache, sent, retries,
+                                              status, outcome):
+    repo.issues[1] = Issue(repo, 1)
+    repo.errors = [github_error(status)]
+    j = make_journal(repo, cache, sent, retries)
+
+    j.record(CLOSE, repo.copy_of(1), old_state='open')
+
+    assert sent == [(CLOSE, outcome)]
+    assert len(j.pending) == (1 if outcome == OFFLINE else 0)
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+import urwid
+from github3.issues import Issue
+
+from benchmarks.fake_github import Repository
+from shipit.store import Delta
+from shipit.ui import LazyListWalker
+
+FAKE = Repository('http://localhost', issues=500, pulls=0, comments=0)
+
+
+def issues(numbers):
+    return [Issue(FAKE.issue(number)) for number in numbers]
+
+
+def test_only_the_rows_drawn_are_built():
+    walker = LazyListWalker(issues(range(500, 0, -1)))
+
+    urwid.ListBox(walker).render((100, 20), focus=True)
+
+    assert 0 < walker.widget_count() <= 20
+
+
+def test_built_rows_are_reused_until_the_item_is_updated():
+    items = issues([3, 2, 1])
+    walker = LazyListWalker(items)
+    widget = walker.widget(1)
+
+    assert walker.widget(1) is widget
+
+    items[1].updated_at += timedelta(minutes=1)
+    assert walker.widget(1) is not widget
+
+
+def test_least_recently_used_rows_are_evicted():
+    walker = LazyListWalker(issues(range(10, 0, -1)), max_widgets=4)
+
+    for position in range(10):
+        walker.widget(position)
+
+    assert walker.widget_count() == 4
+
+
+def test_focus_stays_on_the_same_item():
+    items = issues([3, 2, 1])
+    walker = LazyListWalker(items)
+    walker.set_focus(1)
+
+    walker.set_items(issues([4]) + items)
+    assert walker.get_focus()[1] == 2
+    assert walker.items[2].number == 2
+
+    walker.set_items(items[:1])
+    assert walker.get_focus()[1] == 0
+
+
+def test_delta_only_rebuilds_the_updated_rows():
+    items = issues([3, 2, 1])
+    walker = LazyListWalker(items)
+    kept, updated = walker.widget(0), walker.widget(1)
+
+    walker.apply(Delta(items, [], [], [items[1]]))
+
+    assert walker.widget(0) is kept
+    assert walker.widget(1) is not updated
@@ -0,0 +1,54 @@
+from shipit.cache import conditional, conditional_pages
+from shipit.paging import iter_pages
+
+
+def test_iter_pages_yields_every_page_with_the_total(serve):
+    _, repo = serve(labels=250)
+
+    pages = list(iter_pages(repo.iter_labels()))
+
+    assert [(len(page.items), page.number, page.total) for page in pages] == \
+        [(100, 1, 3), (100, 2, 3), (50, 3, 3)]
+    assert pages[2].items[-1].name == 'label-249'
+
+
+def test_iter_pages_yields_an_empty_page_for_an_empty_listing(serve):
+    _, repo = serve(labels=0)
+
+    pages = list(iter_pages(repo.iter_labels()))
+
+    assert [(page.items, page.number, page.total) for page in pages] == [([], 1, 1)]
+
+
+def test_listing_in_a_page_is_revalidated(serve, cache):
+    server, repo = serve(labels=20)
+
+    assert len(conditional(cache, 'labels', repo.iter_labels)) == 20
+    assert cache.etag('labels') is not None
+
+    assert conditional(cache, 'labels', repo.iter_labels) is None
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert server.request_count == 2
+
+
+def test_longer_listing_is_fetched_in_full(serve, cache):
+    # An item added to the first page would push another to the next one
+    server, repo = serve(labels=150)
+
+    assert len(conditional(cache, 'labels', repo.iter_labels)) == 150
+    assert cache.etag('labels') is None
+
+    assert len(conditional(cache, 'labels', repo.iter_labels)) == 150
+    assert server.request_count == 4
+
+
+def test_longer_listing_with_changes_first_is_revalidated(serve, cache):
+    server, repo = serve(labels=150)
+
+    pages = list(conditional_pages(cache, 'labels', repo.iter_labels,
+                                   changes_first=True))
+    assert len(pages) == 2
+
+    assert list(conditional_pages(cache, 'labels', repo.iter_labels,
+                                  changes_first=True)) == []
+    assert server.request_count == 3
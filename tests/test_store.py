@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from github3.pulls import PullRequest
+
+from shipit.store import ItemStore, item_key
+
+EPOCH = datetime(2020, 1, 1)
+
+
+def issue(number, state='open', labels=(), assignee=None, milestone=None,
+          creator='user0', minutes=0, comments=0):
+    return SimpleNamespace(
+        id=number,
+        number=number,
+        state=state,
+        labels=[SimpleNamespace(name=name) for name in labels],
+        assignee=assignee,
+        milestone=SimpleNamespace(number=milestone) if milestone else None,
+        user=creator,
+        updated_at=EPOCH + timedelta(minutes=minutes),
+        comments=comments,
+    )
+
+
+def pull(number, creator='user0'):
+    pr = PullRequest.__new__(PullRequest)
+    pr.id, pr.number, pr.state = number, number, 'open'
+    pr.user, pr.updated_at = creator, EPOCH
+    return pr
+
+
+def numbers(items):
+    return [item.number for item in items]
+
+
+def test_select_by_kind_and_state():
+    store = ItemStore([issue(1), issue(2, state='closed'), pull(3), issue(4)])
+
+    assert numbers(store.select(kind='issue', state='open')) == [4, 1]
+    assert numbers(store.select(kind='issue', state='closed')) == [2]
+    assert numbers(store.select(kind='pull')) == [3]
+    assert numbers(store.select()) == [4, 3, 2, 1]
+
+
+def test_select_with_every_label_of_a_tuple():
+    store = ItemStore([issue(1, labels=['bug']),
+                       issue(2, labels=['bug', 'ui']),
+                       issue(3, labels=['ui'])])
+
+    assert numbers(store.select(label='bug')) == [2, 1]
+    assert numbers(store.select(label=('bug', 'ui'))) == [2]
+    assert store.select(label=('bug', 'missing')) == []
+
+
+def test_select_by_assignee_milestone_and_creator():
+    store = ItemStore([issue(1, assignee='ana', milestone=1),
+                       issue(2, assignee='ana', milestone=2, creator='bob'),
+                       issue(3, milestone=1, creator='bob'),
+                       pull(4, creator='bob')])
+
+    assert numbers(store.select(assignee='ana')) == [2, 1]
+    assert numbers(store.select(assignee='ana', milestone=1)) == [1]
+    assert numbers(store.select(kind='issue', creator='bob')) == [3, 2]
+    assert numbers(store.select(creator='bob')) == [4, 3, 2]
+    assert store.select(assignee='nobody') == []
+
+
+def test_select_orders():
+    store = ItemStore([issue(1, minutes=30, comments=1),
+                       issue(2, minutes=10, comments=5),
+                       issue(3, minutes=20)])
+
+    assert numbers(store.select('created')) == [3, 2, 1]
+    assert numbers(store.select('updated')) == [1, 3, 2]
+    assert numbers(store.select('comments')) == [2, 1, 3]
+
+
+def test_upsert_reindexes_a_modified_item():
+    item = issue(1)
+    store = ItemStore([item])
+
+    item.state = 'closed'
+    assert store.upsert(item)
+    assert store.select(state='open') == []
+    assert store.select(state='closed') == [item]
+    assert not store.upsert(item)
+
+
+def test_merge_keeps_the_items_not_updated_since():
+    stored = issue(1)
+    store = ItemStore([stored, issue(2)])
+
+    store.merge([issue(1), issue(2, minutes=5)])
+
+    assert store.get('issue', 1) is stored
+    assert store.get('issue', 2).updated_at == EPOCH + timedelta(minutes=5)
+
+
+def test_retain_only_removes_the_items_matching_the_criteria():
+    store = ItemStore([issue(1, labels=['bug']),
+                       issue(2, labels=['bug']),
+                       issue(3, labels=['bug'], state='closed'),
+                       issue(4),
+                       pull(5)])
+
+    changed = store.retain([item_key(issue(1))], kind='issue', state='open',
+                           label=('bug',))
+
+    assert changed
+    assert numbers(store.select()) == [5, 4, 3, 1]
+    assert store.select(label='bug', state='open')[0].number == 1
+
+
+def test_retain_without_stale_items_changes_nothing():
+    store = ItemStore([issue(1), issue(2, state='closed')])
+
+    assert not store.retain([item_key(issue(1))], kind='issue', state='open')
+    assert len(store) == 2
@@ -0,0 +1,76 @@
+from github3.issues import Issue
+
+from benchmarks.fake_github import Repository, timestamp
+from shipit.sync import IssueSync
+
+
+class ChangingRepository(Repository):
+    """A fake repository whose issues can be closed and updated."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.states = {}
+        self.updates = {}
+
+    def state(self, number):
+        return self.states.get(number, None) or super().state(number)
+
+    def updated_minutes(self, number):
+        return self.updates.get(number, None) or super().updated_minutes(number)
+
+
+def sync(issue_sync, state):
+    return [issue.number for page in issue_sync.sync(state) for issue in page.items]
+
+
+def cached_numbers(cache, repo, state):
+    return sorted(issue.number for issue in cache.items('issue', Issue, repo, state))
+
+
+def newest_open(fake):
+    return max(fake.updated_minutes(n) for n in fake.numbers() if fake.state(n) == 'open')
+
+
+def test_first_sync_is_complete_and_sets_the_watermark(serve, cache):
+    server, repo = serve(ChangingRepository, issues=40, pulls=3, comments=0)
+    fake = server.repo
+    issue_sync = IssueSync(repo, cache)
+
+    assert issue_sync.is_complete('open')
+    numbers = sync(issue_sync, 'open')
+
+    expected = [n for n in fake.numbers() if not fake.is_pull(n) and fake.state(n) == 'open']
+    assert sorted(numbers) == expected
+    assert cached_numbers(cache, repo, 'open') == expected
+    assert not issue_sync.is_complete('open')
+    assert cache.watermark('issues/open') == timestamp(newest_open(fake))
+
+
+def test_next_sync_only_fetches_the_issues_updated_since(serve, cache):
+    server, repo = serve(ChangingRepository, issues=40, pulls=3, comments=0)
+    fake = server.repo
+    issue_sync = IssueSync(repo, cache)
+    sync(issue_sync, 'open')
+    newest = newest_open(fake)
+
+    fake.updates[10] = newest + 5
+    numbers = sync(issue_sync, 'open')
+
+    # The newest issue of the last sync is updated at the watermark itself
+    assert 10 in numbers
+    assert all(fake.updated_minutes(n) >= newest for n in numbers)
+    assert len(numbers) < 5
+    assert cache.watermark('issues/open') == timestamp(newest + 5)
+
+
+def test_next_sync_sees_the_issues_closed_since(serve, cache):
+    server, repo = serve(ChangingRepository, issues=40, pulls=3, comments=0)
+    fake = server.repo
+    issue_sync = IssueSync(repo, cache)
+    sync(issue_sync, 'open')
+
+    fake.states[10] = 'closed'
+    fake.updates[10] = newest_open(fake) + 5
+    assert 10 in sync(issue_sync, 'open')
+
+    assert 10 not in cached_numbers(cache, repo, 'open')
+    assert 10 in cached_numbers(cache, repo, 'closed')